@@ -1,35 +1,61 @@
-from flask import Flask, jsonify, send_file
-from datetime import datetime
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import base64
+import copy
+import email.utils
+import gzip
+import hashlib
 import json
+import logging
+import math
 import os
-import schedule
+import random
+import re
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
 import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import closing, contextmanager, suppress
+import contextvars
 from io import BytesIO
 import xml.etree.ElementTree as ET
+import zipfile
 import traceback
+import unicodedata
+import urllib.parse
+import uuid
 
-import requests
-from openai import OpenAI
-
-# PDF (ReportLab)
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    ListFlowable,
-    ListItem,
-    Table,
-    TableStyle,
-)
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# requests, openai, reportlab y numpy se importan al usarse por primera vez (arranque
+# rápido de los workers): ver http_session(), openai_client(), render_report_pdf() y TrendStore.
 
 
 app = Flask(__name__)
-STORAGE_FILE = "reports.json"
-client = OpenAI()
+STORAGE_FILE = "reports.json"  # formato antiguo; solo se lee para migrar a REPORTS_DB
+
+
+def stderr_logger(name: str) -> logging.Logger:
+    # Por stderr: stdout queda para quien use app.py como librería (p. ej. bench/startup.py)
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(name)s] %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+log = stderr_logger(__name__)
 
 
 # ---------------------------
@@ -54,31 +80,308 @@ def news_query() -> str:
 
 
 def news_language() -> str:
+    profile = _active_profile.get()
+    if profile is not None:
+        return profile.lang
     return os.getenv("NEWS_LANG", "es").strip()
 
 
 def news_country() -> str:
+    profile = _active_profile.get()
+    if profile is not None:
+        return profile.country
     return os.getenv("NEWS_COUNTRY", "ES").strip()
 
 
+def news_queries() -> list[str]:
+    """
+    NEWS_QUERIES permite varias búsquedas separadas por "|" (distritos, financiación...).
+    Si no está, se usa la NEWS_QUERY de siempre. Dentro de un perfil, sus consultas.
+    """
+    profile = _active_profile.get()
+    if profile is not None:
+        return list(profile.queries)
+    raw = os.getenv("NEWS_QUERIES", "")
+    queries = [q.strip() for q in raw.split("|") if q.strip()]
+    return queries or [news_query()]
+
+
+def news_feeds() -> list[str]:
+    # Feeds RSS adicionales (URLs completas) separados por espacios o comas
+    profile = _active_profile.get()
+    if profile is not None:
+        return list(profile.feeds)
+    raw = os.getenv("NEWS_FEEDS", "")
+    return [u.strip() for u in raw.replace(",", " ").split() if u.strip()]
+
+
 def max_news_items() -> int:
     return env_int("NEWS_MAX_ITEMS", 10)
 
 
+def max_total_news_items() -> int:
+    return env_int("NEWS_MAX_TOTAL_ITEMS", 30)
+
+
+def news_fetch_workers() -> int:
+    return max(1, env_int("NEWS_FETCH_WORKERS", 6))
+
+
+def news_stream_parse() -> bool:
+    # 1 = parser incremental sobre el socket; 0 = descarga completa + ET.fromstring
+    return os.getenv("NEWS_STREAM_PARSE", "1").strip() != "0"
+
+
+def news_fetch_deadline() -> float:
+    # Tope de la etapa RSS completa (todos los feeds)
+    return float(env_int("NEWS_FETCH_DEADLINE", 20))
+
+
+def rss_timeout() -> float:
+    # Timeout de cada petición a un feed
+    return float(env_int("RSS_TIMEOUT", 10))
+
+
+def openai_timeout() -> float:
+    # Timeout de cada llamada a OpenAI
+    return float(env_int("OPENAI_TIMEOUT", 60))
+
+
+def generate_deadline() -> float:
+    # Presupuesto total de ReportGenerator.generate() (RSS + modelo)
+    return float(env_int("GENERATE_DEADLINE", 150))
+
+
+client = None
+_client_lock = threading.Lock()
+
+
+def openai_client():
+    """
+    Cliente de OpenAI, creado (e importado el SDK) en la primera llamada.
+    Los reintentos los gestiona call_with_retries (con circuit breaker), no el SDK.
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+
+                client = OpenAI(timeout=openai_timeout(), max_retries=0)
+    return client
+
+
+def incremental_generation() -> bool:
+    # 1 = dentro de la misma semana solo se envían al modelo las noticias nuevas
+    return os.getenv("INCREMENTAL_GENERATION", "1").strip() != "0"
+
+
+def prompt_token_budget() -> int:
+    # Tokens (aprox.) máximos de noticias en el prompt; 0 = sin límite
+    return env_int("PROMPT_TOKEN_BUDGET", 3000)
+
+
+def news_dedup_threshold() -> float:
+    # Similitud (0-1) a partir de la cual dos noticias se consideran la misma
+    try:
+        return float(os.getenv("NEWS_DEDUP_THRESHOLD", "0.5"))
+    except ValueError:
+        return 0.5
+
+
 def openai_model() -> str:
-    # Si te falla el modelo, cambia esto en Render con OPENAI_MODEL
+    # Si te falla el modelo, cambia esto en Render con OPENAI_MODEL (o "model" en el perfil)
+    profile = _active_profile.get()
+    if profile is not None and profile.model:
+        return profile.model
     return os.getenv("OPENAI_MODEL", "gpt-4o-mini").strip()
 
 
+# ---------------------------
+# Perfiles de informe
+# ---------------------------
+DEFAULT_PROFILE = "default"
+_PROFILE_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+# Perfil de la generación en curso (lo leen news_queries(), openai_model()...)
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+
+
+class ReportProfile:
+    """
+    Un informe con su propia búsqueda, idioma/país y modelo (p. ej. una ciudad).
+    priority: menor = se genera antes en el scheduler.
+    """
+
+    def __init__(self, name, queries, feeds=(), lang="es", country="ES", model=None, priority=100, title=None):
+        self.name = name
+        self.queries = tuple(queries)
+        self.feeds = tuple(feeds)
+        self.lang = lang
+        self.country = country
+        self.model = model
+        self.priority = priority
+        self.title = title or name
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "queries": list(self.queries),
+            "feeds": list(self.feeds),
+            "lang": self.lang,
+            "country": self.country,
+            "model": self.model or openai_model(),
+            "priority": self.priority,
+        }
+
+
+def _profile_from_config(name: str, cfg: dict) -> ReportProfile:
+    if not _PROFILE_NAME_RE.match(name):
+        raise ValueError(f"Nombre de perfil no válido: {name!r} (a-z, 0-9, - y _)")
+    queries = cfg.get("queries") or ([cfg["query"]] if cfg.get("query") else [])
+    if isinstance(queries, str):
+        queries = [q.strip() for q in queries.split("|")]
+    queries = [q for q in queries if q]
+    if not queries:
+        raise ValueError(f"El perfil {name!r} no tiene query/queries")
+    feeds = cfg.get("feeds") or []
+    if isinstance(feeds, str):
+        feeds = feeds.replace(",", " ").split()
+    return ReportProfile(
+        name,
+        queries,
+        feeds=feeds,
+        lang=(cfg.get("lang") or news_language()).strip(),
+        country=(cfg.get("country") or news_country()).strip(),
+        model=(cfg.get("model") or "").strip() or None,
+        priority=int(cfg.get("priority", 100)),
+        title=cfg.get("title"),
+    )
+
+
+_profiles_cache = (None, None)
+_profiles_lock = threading.Lock()
+# Variables de las que salen el perfil "default" y los valores por defecto de los demás
+_PROFILE_ENV = ("NEWS_QUERY", "NEWS_QUERIES", "NEWS_FEEDS", "NEWS_LANG", "NEWS_COUNTRY", "OPENAI_MODEL")
+
+
+def load_profiles() -> dict:
+    """
+    Perfiles configurados, ordenados por prioridad. Se leen de REPORT_PROFILES
+    (JSON) o del fichero REPORT_PROFILES_FILE, como lista de objetos con "name"
+    o como {nombre: {...}}:
+
+        [{"name": "madrid", "queries": ["vivienda madrid", "euribor"], "priority": 0},
+         {"name": "barcelona", "query": "precio vivienda barcelona", "model": "gpt-4o"}]
+
+    Sin configuración hay un único perfil "default" con NEWS_QUERY/NEWS_QUERIES,
+    NEWS_LANG, NEWS_COUNTRY y OPENAI_MODEL.
+    """
+    global _profiles_cache
+    raw = os.getenv("REPORT_PROFILES", "").strip()
+    path = os.getenv("REPORT_PROFILES_FILE", "").strip()
+    mtime = None
+    if not raw and path:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            raise ValueError(f"REPORT_PROFILES_FILE no existe: {path}")
+    signature = (raw, path, mtime, tuple(os.getenv(name) for name in _PROFILE_ENV))
+    cached_sig, cached = _profiles_cache
+    if cached_sig == signature:
+        return cached
+
+    with _profiles_lock:
+        if not raw and path:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+        # Los perfiles salen del entorno, no del perfil activo de quien pregunta
+        token = _active_profile.set(None)
+        try:
+            if raw:
+                config = json.loads(raw)
+                if isinstance(config, dict):
+                    config = [dict(cfg, name=name) for name, cfg in config.items()]
+                profiles = [_profile_from_config(str(cfg.get("name", "")).strip(), cfg) for cfg in config]
+            else:
+                profiles = [ReportProfile(DEFAULT_PROFILE, news_queries(), news_feeds(), news_language(), news_country())]
+        finally:
+            _active_profile.reset(token)
+        profiles.sort(key=lambda p: (p.priority, p.name))
+        result = {p.name: p for p in profiles}
+        if len(result) != len(profiles):
+            raise ValueError("Hay perfiles con el mismo nombre")
+        _profiles_cache = (signature, result)
+    return result
+
+
+def default_profile_name() -> str:
+    # REPORT_DEFAULT_PROFILE, "default" si existe, o el de mayor prioridad
+    profiles = load_profiles()
+    name = os.getenv("REPORT_DEFAULT_PROFILE", "").strip()
+    if name in profiles:
+        return name
+    return DEFAULT_PROFILE if DEFAULT_PROFILE in profiles else next(iter(profiles))
+
+
+def get_profile(name: str | None = None):
+    """
+    Perfil por nombre (None = el de por defecto); None si no existe.
+    """
+    return load_profiles().get(name or default_profile_name())
+
+
+class UnknownProfileError(LookupError):
+    pass
+
+
+@contextmanager
+def using_profile(profile: ReportProfile):
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
+
+
+def news_rss_base_url() -> str:
+    # Endpoint de búsqueda RSS (se puede apuntar a un servidor local en pruebas de carga)
+    return os.getenv("NEWS_RSS_BASE_URL", "https://news.google.com/rss/search").strip()
+
+
 def build_google_news_rss_url(query: str, lang: str = "es", country: str = "ES") -> str:
     ceid = f"{country}:{lang}"
     return (
-        "https://news.google.com/rss/search?q="
-        + requests.utils.quote(query)
+        news_rss_base_url()
+        + "?q="
+        + urllib.parse.quote(query)
         + f"&hl={lang}&gl={country}&ceid={ceid}"
     )
 
 
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def http_session():
+    """
+    Sesión HTTP compartida (keep-alive + pool de conexiones) para todos los feeds.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+
+                s = requests.Session()
+                pool = max(10, news_fetch_workers())
+                adapter = requests.adapters.HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _http_session = s
+    return _http_session
+
+
 def _clean_text(s: str) -> str:
     if not s:
         return ""
@@ -88,176 +391,3222 @@ def _clean_text(s: str) -> str:
     return s.strip()
 
 
-def fetch_news_items(query: str, max_items: int = 10, lang: str = "es", country: str = "ES") -> list[dict]:
+# ---------------------------
+# Métricas (formato Prometheus, sin dependencias)
+# ---------------------------
+class Metrics:
     """
-    Lee Google News RSS (XML) sin dependencias externas.
+    Contadores e histogramas en memoria, expuestos en texto Prometheus por /metrics.
+    Son por proceso: con varios workers, Prometheus debe agregar por instancia.
     """
-    rss_url = build_google_news_rss_url(query, lang=lang, country=country)
-    headers = {"User-Agent": "Mozilla/5.0 (compatible; WeeklyEconomicReport/1.0)"}
-    r = requests.get(rss_url, headers=headers, timeout=20)
-    r.raise_for_status()
 
-    root = ET.fromstring(r.text)
-    channel = root.find("channel")
-    if channel is None:
-        return []
+    SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    BYTES_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+    COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200)
 
-    items = []
-    for item in channel.findall("item")[:max_items]:
-        title = (item.findtext("title", default="") or "").strip()
-        link = (item.findtext("link", default="") or "").strip()
-        pub_date = (item.findtext("pubDate", default="") or "").strip()
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
 
-        source_el = item.find("source")
-        source = source_el.text.strip() if (source_el is not None and source_el.text) else ""
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
 
-        desc = item.findtext("description", default="") or ""
-        snippet = _clean_text(desc)
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
 
-        items.append(
-            {
-                "title": title,
-                "url": link,
-                "published": pub_date,
-                "source": source,
-                "snippet": snippet,
+    def observe(self, name: str, value: float, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"buckets": tuple(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, le in enumerate(h["buckets"]):
+                if value <= le:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    @staticmethod
+    def _labels(pairs, extra=()) -> str:
+        pairs = list(pairs) + list(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: dict(v, counts=list(v["counts"])) for k, v in self._histograms.items()}
+        names = sorted({k[0] for k in counters} | {k[0] for k in histograms})
+        for name in names:
+            kind, text = self._help.get(name, ("counter" if any(k[0] == name for k in counters) else "histogram", name))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    out.append(f"{name}{self._labels(labels)} {value:g}")
+            for (n, labels), h in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for le, c in zip(h["buckets"], h["counts"]):
+                    out.append(f"{name}_bucket{self._labels(labels, [('le', f'{le:g}')])} {c}")
+                out.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {h['count']}")
+                out.append(f"{name}_sum{self._labels(labels)} {h['sum']:g}")
+                out.append(f"{name}_count{self._labels(labels)} {h['count']}")
+        return "\n".join(out) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("report_stage_seconds", "histogram", "Duración de cada etapa del pipeline")
+METRICS.describe("report_payload_bytes", "histogram", "Tamaño de los payloads por etapa")
+METRICS.describe("report_items", "histogram", "Noticias por etapa")
+METRICS.describe("report_fallback_total", "counter", "Informes generados sin IA, por motivo")
+METRICS.describe("report_cache_total", "counter", "Consultas a caches, por cache y resultado")
+METRICS.describe("report_generations_total", "counter", "Generaciones terminadas, por perfil")
+METRICS.describe("upstream_breaker_open_total", "counter", "Aperturas de circuit breaker, por upstream")
+
+# Desglose de la generación en curso (se guarda con el informe)
+_run_stats = contextvars.ContextVar("run_stats", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_stage(stage: str, seconds: float):
+    METRICS.observe("report_stage_seconds", seconds, stage=stage)
+    run = _run_stats.get()
+    if run is not None:
+        st = run["stages"].setdefault(stage, {"seconds": 0.0, "count": 0})
+        st["seconds"] = round(st["seconds"] + seconds, 4)
+        st["count"] += 1
+
+
+def record_size(stage: str, nbytes: int):
+    METRICS.observe("report_payload_bytes", nbytes, buckets=Metrics.BYTES_BUCKETS, stage=stage)
+    run = _run_stats.get()
+    if run is not None:
+        run["bytes"][stage] = run["bytes"].get(stage, 0) + nbytes
+
+
+def record_items(stage: str, n: int):
+    METRICS.observe("report_items", n, buckets=Metrics.COUNT_BUCKETS, stage=stage)
+    run = _run_stats.get()
+    if run is not None:
+        run["items"][stage] = n
+
+
+def record_cache(cache: str, result: str):
+    METRICS.inc("report_cache_total", cache=cache, result=result)
+    run = _run_stats.get()
+    if run is not None:
+        run["cache"][f"{cache}_{result}"] = run["cache"].get(f"{cache}_{result}", 0) + 1
+
+
+def submit_in_context(pool: ThreadPoolExecutor, fn, *args):
+    # Los hilos del pool no heredan contextvars: copiamos el contexto en cada tarea
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+# ---------------------------
+# Resiliencia: presupuestos de tiempo, reintentos y circuit breakers
+# ---------------------------
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class Deadline:
+    """
+    Presupuesto de tiempo de extremo a extremo. Cada etapa pide su timeout con
+    cap(): nunca más de lo que le queda al conjunto.
+    """
+
+    def __init__(self, seconds: float, label: str = ""):
+        self.label = label
+        self.budget = float(seconds)
+        self.started = time.monotonic()
+        self.expires_at = self.started + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, timeout: float) -> float:
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded(f"Sin presupuesto de tiempo ({self.label or 'deadline'})")
+        return min(float(timeout), left)
+
+    def child(self, seconds: float, label: str = "") -> "Deadline":
+        # Sub-presupuesto para una etapa, nunca mayor que lo que queda
+        return Deadline(min(float(seconds), self.remaining()), label=label or self.label)
+
+    def snapshot(self) -> dict:
+        return {
+            "label": self.label,
+            "budget_s": self.budget,
+            "elapsed_s": round(time.monotonic() - self.started, 3),
+            "remaining_s": round(self.remaining(), 3),
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold fallos seguidos) -> open -> (reset_timeout) ->
+    half_open: deja pasar una llamada de prueba; si va bien se cierra, si no
+    vuelve a abrirse.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def release(self):
+        """
+        La llamada terminó sin decir nada de la salud del upstream (p. ej. un 4xx):
+        no cambia el estado, solo libera la llamada de prueba si la había.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, exc: Exception | None = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = repr(exc) if exc is not None else None
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    METRICS.inc("upstream_breaker_open_total", breaker=self.name)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in_s": retry_in,
+                "last_error": self.last_error,
             }
-        )
 
-    return items
 
+def _new_breaker(name: str, kind: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=env_int(f"{kind.upper()}_BREAKER_FAILURES", 5),
+        reset_timeout=env_int(f"{kind.upper()}_BREAKER_RESET", 60),
+    )
 
-def build_fallback_report(news_items: list[dict], week: str) -> dict:
+
+BREAKERS = {"openai": _new_breaker("openai", "openai")}
+_breakers_lock = threading.Lock()
+
+
+def rss_breaker(url: str) -> CircuitBreaker:
+    # Uno por host: un feed caído no debe cortar los de otros dominios
+    name = "rss:" + (urllib.parse.urlsplit(url).netloc.lower() or "-")
+    with _breakers_lock:
+        breaker = BREAKERS.get(name)
+        if breaker is None:
+            breaker = BREAKERS[name] = _new_breaker(name, "rss")
+        return breaker
+
+
+def _is_retryable(exc: Exception) -> bool:
+    # Errores "nuestros" (4xx, JSON inválido, sin tiempo) no mejoran reintentando
+    if isinstance(exc, (DeadlineExceeded, CircuitOpenError, ValueError, ET.ParseError)):
+        return False
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500 or status in (408, 429)
+    return True
+
+
+def call_with_retries(fn, breaker: CircuitBreaker, deadline: Deadline | None = None, attempts: int = 3,
+                      base_delay: float = 0.5, max_delay: float = 8.0):
     """
-    Si OpenAI falla, generamos un informe básico con titulares + fuentes.
+    Ejecuta fn() con reintentos (backoff exponencial con jitter completo),
+    respetando el circuit breaker del upstream y el deadline global.
     """
-    bullets = []
-    sources = []
-    for it in news_items[:8]:
-        t = it.get("title", "")
-        s = it.get("source", "")
-        bullets.append(f"{t} ({s})")
-        if it.get("url"):
-            sources.append({"url": it["url"], "note": it.get("source", "")})
+    last_exc = None
+    for attempt in range(max(1, attempts)):
+        if deadline is not None and deadline.expired:
+            raise last_exc or DeadlineExceeded(f"Sin presupuesto de tiempo para {breaker.name}")
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuito '{breaker.name}' abierto")
+        try:
+            result = fn()
+        except Exception as e:
+            last_exc = e
+            if not _is_retryable(e):
+                # El upstream ha respondido, pero con error: ni caída ni recuperación
+                breaker.release()
+                raise
+            breaker.record_failure(e)
+            delay = random.uniform(0, min(max_delay, base_delay * (2**attempt)))
+            if attempt == attempts - 1 or (deadline is not None and delay >= deadline.remaining()):
+                break
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+    raise last_exc
+
+
+_active_deadlines = set()
+_active_deadlines_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Limitador compartido (token bucket) de peticiones y tokens por minuto.
+
+    acquire(tokens) espera hasta que haya cupo para una petición más y para
+    esos tokens; con deadline, falla en vez de esperar más de lo que queda.
+    Un límite de 0 desactiva esa dimensión.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.rpm = max(0, rpm)
+        self.tpm = max(0, tpm)
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
 
+    def acquire(self, tokens: int = 0, deadline: Deadline | None = None) -> float:
+        """
+        Reserva cupo para una petición de ~tokens tokens. Devuelve los segundos esperados.
+        """
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill()
+                wait_req = (1 - self._requests) * 60 / self.rpm if self.rpm and self._requests < 1 else 0.0
+                wait_tok = (tokens - self._tokens) * 60 / self.tpm if self.tpm and self._tokens < tokens else 0.0
+                wait_for = max(wait_req, wait_tok)
+                if wait_for <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    self._tokens -= tokens
+                    waited = time.monotonic() - start
+                    if waited:
+                        record_stage(f"{self.name}_rate_wait", waited)
+                    return waited
+                if deadline is not None and deadline.remaining() < wait_for:
+                    raise DeadlineExceeded(f"{deadline.label}: sin cupo en {self.name} a tiempo ({wait_for:.1f}s)")
+                self._cond.wait(wait_for)
+
+    def settle(self, estimated: int, actual: int | None):
+        # Corrige la reserva con los tokens reales que ha informado la API
+        if not self.tpm or actual is None:
+            return
+        with self._cond:
+            self._refill()
+            self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - actual)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_available": round(self._requests, 1) if self.rpm else None,
+                "tokens_available": round(self._tokens) if self.tpm else None,
+            }
+
+
+# Compartido por todos los perfiles y llamadas de este proceso (límites de la cuenta de OpenAI)
+openai_limiter = RateLimiter("openai", rpm=env_int("OPENAI_RPM", 500), tpm=env_int("OPENAI_TPM", 200000))
+
+
+def upstream_status() -> dict:
+    with _active_deadlines_lock:
+        running = [d.snapshot() for d in _active_deadlines]
+    with _breakers_lock:
+        breakers = sorted(BREAKERS.items())
     return {
-        "title": "Weekly Economic Report (fallback)",
-        "week": week,
-        "executive_summary": [
-            "No se pudo generar el informe con IA (error o timeout).",
-            "Se adjunta un resumen básico de titulares y enlaces como alternativa.",
-        ],
-        "sections": [
-            {"heading": "Titulares destacados", "bullets": bullets or ["No hay titulares disponibles."]}
-        ],
-        "sources": sources,
-        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "breakers": {name: b.snapshot() for name, b in breakers},
+        "rate_limits": {"openai": openai_limiter.snapshot()},
+        "running_generations": running,
     }
 
 
-def build_report_with_openai(news_items: list[dict], week: str) -> dict:
+# ---------------------------
+# Feed cache (RSS + validadores HTTP)
+# ---------------------------
+def feed_cache_ttl() -> int:
+    # Segundos durante los que un feed se reutiliza sin preguntar a Google
+    return env_int("FEED_CACHE_TTL", 300)
+
+
+class FeedCache:
     """
-    Genera un informe original basado en titulares+snippets.
+    Cache persistente de feeds RSS, indexada por la URL del feed.
+    Guarda los items ya parseados junto con ETag/Last-Modified para poder
+    revalidar con un GET condicional y reutilizarlos si llega un 304.
     """
-    lines = []
-    for i, it in enumerate(news_items, start=1):
-        lines.append(
-            f"{i}. TITULAR: {it.get('title','')}\n"
-            f"   FECHA: {it.get('published','')}\n"
-            f"   MEDIO: {it.get('source','')}\n"
-            f"   LINK: {it.get('url','')}\n"
-            f"   SNIPPET: {it.get('snippet','')}\n"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, url: str):
+        with self._lock:
+            entry = self._mem.get(url)
+        if entry is not None:
+            return entry
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception:
+            return None
+        if entry.get("url") != url:
+            return None
+        with self._lock:
+            self._mem[url] = entry
+        return entry
+
+    def put(self, url: str, entry: dict):
+        with self._lock:
+            self._mem[url] = entry
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(url) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(url))
+        except OSError:
+            pass
+
+    def touch(self, url: str):
+        # 304: el contenido sigue valiendo, renovamos el TTL
+        entry = self.get(url)
+        if entry is not None:
+            self.put(url, dict(entry, fetched_at=time.time()))
+
+
+feed_cache = FeedCache(os.getenv("FEED_CACHE_DIR", "feed_cache"))
+
+
+def fetch_news_items(query: str, max_items: int = 10, lang: str = "es", country: str = "ES") -> list[dict]:
+    """
+    Lee Google News RSS (XML) sin dependencias externas.
+    """
+    rss_url = build_google_news_rss_url(query, lang=lang, country=country)
+    return fetch_feed_items(rss_url, max_items=max_items)
+
+
+def fetch_feed_items(rss_url: str, max_items: int = 10, timeout: float = 20, deadline: Deadline | None = None) -> list[dict]:
+    """
+    Descarga y parsea un feed RSS cualquiera (Google News u otro).
+    Reintenta los fallos transitorios; si el feed no responde (o su circuito
+    está abierto) y hay una copia en cache, se devuelve esa copia.
+    """
+    cached = feed_cache.get(rss_url)
+    # Solo sirve si en su día se pidieron al menos tantos items como ahora
+    usable = cached is not None and cached.get("max_items", 0) >= max_items
+    if usable and time.time() - cached.get("fetched_at", 0) < feed_cache_ttl():
+        record_cache("feed", "hit")
+        return [dict(it) for it in cached["items"][:max_items]]
+
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; WeeklyEconomicReport/1.0)"}
+    if usable and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if usable and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    def download():
+        stream = news_stream_parse()
+        request_timeout = deadline.cap(timeout) if deadline is not None else timeout
+        with timed("rss_fetch"):
+            r = http_session().get(rss_url, headers=headers, timeout=request_timeout, stream=stream)
+            try:
+                if r.status_code == 304 and usable:
+                    return None, r.headers
+                r.raise_for_status()
+
+                # En modo streaming "rss_parse" incluye la lectura del socket (van a la vez)
+                if stream:
+                    # Descomprime gzip al vuelo y deja de leer del socket al llegar a max_items
+                    r.raw.decode_content = True
+                    with timed("rss_parse"):
+                        parsed = parse_rss_stream(r.raw, max_items)
+                    record_size("rss", r.raw.tell())
+                else:
+                    body = r.text
+                    record_size("rss", len(r.content))
+                    with timed("rss_parse"):
+                        parsed = parse_rss_document(body, max_items)
+                return parsed, r.headers
+            finally:
+                r.close()
+
+    try:
+        items, resp_headers = call_with_retries(
+            download, rss_breaker(rss_url), deadline=deadline, attempts=env_int("RSS_RETRIES", 3)
         )
-    input_text = "\n".join(lines).strip()
-
-    instructions = (
-        "IMPORTANTE: Devuelve SOLO json válido (json). No añadas texto fuera del JSON.\n\n"
-        "Eres analista del mercado inmobiliario en España. "
-        "Con la lista de noticias (titulares + snippets) redacta un INFORME SEMANAL original, claro y accionable.\n\n"
-        "Reglas:\n"
-        "- NO copies artículos ni pegues texto largo: usa el snippet solo como señal.\n"
-        "- Si un dato no aparece, dilo explícitamente; NO inventes.\n"
-        "- Secciones sugeridas: Precios, Demanda, Oferta/Stock, Financiación, Regulación, Riesgos.\n"
-        "- Incluye 'Fuentes' con enlaces.\n\n"
-        "Salida EXACTA en json con esta estructura:\n"
-        "{\n"
-        '  "title": string,\n'
-        '  "week": string,\n'
-        '  "executive_summary": [string, ...],\n'
-        '  "sections": [{"heading": string, "bullets": [string, ...]} ...],\n'
-        '  "sources": [{"url": string, "note": string} ...],\n'
-        '  "generated_at": string\n'
-        "}\n"
-    )
+    except Exception as e:
+        if not usable:
+            raise
+        # Mejor las noticias de hace un rato que ninguna
+        log.warning("Feed %s no disponible (%r); se usa la copia en cache", rss_url, e)
+        record_cache("feed", "stale")
+        return [dict(it) for it in cached["items"][:max_items]]
+
+    if items is None:
+        record_cache("feed", "not_modified")
+        feed_cache.touch(rss_url)
+        return [dict(it) for it in cached["items"][:max_items]]
 
-    resp = client.responses.create(
-        model=openai_model(),
-        instructions=instructions,
-        input=f"(json) Semana objetivo: {week}\n\nNOTICIAS:\n{input_text}",
-        text={"format": {"type": "json_object"}},
-        # Si tu SDK soporta timeout, perfecto. Si no, igual tirará del timeout de requests interno.
+    feed_cache.put(
+        rss_url,
+        {
+            "url": rss_url,
+            "etag": resp_headers.get("ETag", ""),
+            "last_modified": resp_headers.get("Last-Modified", ""),
+            "fetched_at": time.time(),
+            "max_items": max_items,
+            "items": items,
+        },
     )
+    record_cache("feed", "miss")
+    return [dict(it) for it in items]
 
-    data = json.loads(resp.output_text)
-    data["week"] = data.get("week") or week
-    data["generated_at"] = data.get("generated_at") or datetime.now().isoformat(timespec="seconds")
-    data["title"] = data.get("title") or "Weekly Economic Report"
-    return data
 
+def _rss_item_to_dict(item) -> dict:
+    title = (item.findtext("title", default="") or "").strip()
+    link = (item.findtext("link", default="") or "").strip()
+    pub_date = (item.findtext("pubDate", default="") or "").strip()
+
+    source_el = item.find("source")
+    source = source_el.text.strip() if (source_el is not None and source_el.text) else ""
+
+    desc = item.findtext("description", default="") or ""
+    snippet = _clean_text(desc)
+
+    return {
+        "title": title,
+        "url": link,
+        "published": pub_date,
+        "source": source,
+        "snippet": snippet,
+    }
+
+
+def _valid_rss_item(it: dict) -> bool:
+    # Mismo criterio en los dos parsers: sin titular o sin enlace el item no sirve
+    return bool(it["title"] and it["url"])
+
+
+def parse_rss_document(text: str, max_items: int) -> list[dict]:
+    """
+    Parseo clásico: árbol completo en memoria. Devuelve los mismos items que
+    parse_rss_stream (los max_items primeros válidos).
+    """
+    root = ET.fromstring(text)
+    channel = root.find("channel")
+    if channel is None:
+        return []
+    items = []
+    for elem in channel.findall("item"):
+        if len(items) >= max_items:
+            break
+        it = _rss_item_to_dict(elem)
+        if _valid_rss_item(it):
+            items.append(it)
+    return items
+
+
+def parse_rss_stream(fileobj, max_items: int) -> list[dict]:
+    """
+    Parseo incremental (iterparse): cada <item> se convierte y se libera según
+    llega, y se para de leer en cuanto hay max_items items válidos.
+    """
+    items = []
+    if max_items <= 0:
+        return items
+
+    channel = None
+    for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "channel":
+                channel = elem
+            continue
+        if elem.tag != "item":
+            continue
+
+        it = _rss_item_to_dict(elem)
+        # Libera el item ya procesado para no acumular el DOM
+        elem.clear()
+        if channel is not None:
+            channel.clear()
+
+        if _valid_rss_item(it):
+            items.append(it)
+            if len(items) >= max_items:
+                break
+    return items
+
+
+def fetch_news_feeds(
+    queries: list[str],
+    feeds: list[str] | None = None,
+    max_items: int = 10,
+    lang: str = "es",
+    country: str = "ES",
+    timeout: float | None = None,
+    max_total: int | None = None,
+    deadline: Deadline | None = None,
+) -> list[dict]:
+    """
+    Descarga varias búsquedas de Google News + feeds RSS extra en paralelo,
+    fusiona los resultados y elimina duplicados por URL.
+
+    Un feed lento no bloquea al resto: lo que no haya llegado en `timeout`
+    segundos (o antes, si se acaba el `deadline` global) se descarta.
+    """
+    # URL -> consulta (o feed) que la origina, para saber qué búsquedas encontraron cada noticia
+    labels = {build_google_news_rss_url(q, lang=lang, country=country): q for q in queries if q}
+    for u in feeds or []:
+        if u:
+            labels.setdefault(u, u)
+    urls = list(labels)
+    if not urls:
+        return []
+
+    timeout = news_fetch_deadline() if timeout is None else timeout
+    stage = deadline.child(timeout, label="rss") if deadline is not None else Deadline(timeout, label="rss")
+    timeout = stage.remaining()
+    pool = ThreadPoolExecutor(max_workers=min(len(urls), news_fetch_workers()))
+    futures = [submit_in_context(pool, fetch_feed_items, u, max_items, rss_timeout(), stage) for u in urls]
+    done, not_done = wait(futures, timeout=timeout)
+    # No esperamos a los rezagados: sus hilos terminan solos (timeout de requests)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    merged = []
+    seen = {}
+    # Mantenemos el orden de configuración de las consultas, no el de llegada
+    for url, fut in zip(urls, futures):
+        if fut not in done:
+            continue
+        try:
+            feed_items = fut.result()
+        except Exception:
+            traceback.print_exc()
+            continue
+        for it in feed_items:
+            key = it.get("url") or it.get("title")
+            if not key:
+                continue
+            if key in seen:
+                if labels[url] not in seen[key]["queries"]:
+                    seen[key]["queries"].append(labels[url])
+                continue
+            # Copia: los items del feed pueden venir de la cache en memoria
+            seen[key] = it = dict(it, queries=[labels[url]])
+            merged.append(it)
+
+    if not_done:
+        log.warning("%d feed(s) sin respuesta tras %.1fs; se ignoran", len(not_done), timeout)
+
+    if max_total is not None:
+        merged = merged[:max_total]
+    return merged
+
+
+# ---------------------------
+# Archivo de noticias
+# ---------------------------
+# Parámetros de seguimiento que no cambian el artículo
+_TRACKING_PARAMS = re.compile(r"^(utm_.*|oc|fbclid|gclid|mc_[a-z]+|ref|cmpid|ns_.*)$", re.IGNORECASE)
+
+
+def canonical_url(url: str) -> str:
+    """
+    URL normalizada para deduplicar: esquema y host en minúsculas, sin
+    fragmento, sin parámetros de seguimiento y con el resto ordenados.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    parts = urllib.parse.urlsplit(url)
+    query = sorted(
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(k)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urllib.parse.urlencode(query), "")
+    )
+
+
+def news_item_id(item: dict) -> str:
+    """
+    Identificador por contenido: hash de la URL canónica o, si no hay URL,
+    del titular normalizado + medio.
+    """
+    url = canonical_url(item.get("url", ""))
+    basis = url or "title:" + " ".join(_fold_text(item.get("title", "")).split()) + "|" + _fold_text(item.get("source", ""))
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()[:32]
+
+
+def published_week(published: str) -> str | None:
+    # pubDate RFC 822 -> semana en el formato de now_week()
+    try:
+        return email.utils.parsedate_to_datetime(published).strftime("%Y-W%W")
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+NEWS_SOURCES = ("auto", "network", "archive")
+WEEK_RE = re.compile(r"^\d{4}-W\d{2}$")
+
+
+def archive_fresh_seconds() -> int:
+    # Re-ejecutar la semana actual dentro de este margen usa el archivo, no la red
+    return env_int("ARCHIVE_FRESH_SECONDS", feed_cache_ttl())
+
+
+class NewsArchive:
+    """
+    Archivo de todas las noticias descargadas, en SQLite.
+
+    Cada noticia se guarda una sola vez (id = hash de su URL canónica o de su
+    contenido) con su primera y última aparición y las consultas que la
+    encontraron. Una tabla aparte la asocia a (perfil, semana) en que se vio
+    (y a la semana de su fecha de publicación), de modo que re-ejecutar o
+    rellenar una semana puede leer del archivo sin volver a la red.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            with closing(self._connect()) as conn:
+                conn.executescript(
+                    "CREATE TABLE IF NOT EXISTS news_items ("
+                    " id TEXT PRIMARY KEY,"
+                    " url TEXT NOT NULL,"
+                    " canonical_url TEXT NOT NULL,"
+                    " title TEXT NOT NULL,"
+                    " source TEXT NOT NULL,"
+                    " published TEXT NOT NULL,"
+                    " snippet TEXT NOT NULL,"
+                    " queries TEXT NOT NULL,"
+                    " first_seen REAL NOT NULL,"
+                    " last_seen REAL NOT NULL) WITHOUT ROWID;"
+                    "CREATE INDEX IF NOT EXISTS news_items_source ON news_items (source, first_seen);"
+                )
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                        self._migrate_v1(conn)
+                    conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            self._ready = True
+
+    def _migrate_v1(self, conn: sqlite3.Connection):
+        # v0 indexaba solo por semana; v1 por (perfil, semana). Lo anterior es del perfil por defecto
+        profile = default_profile_name()
+        conn.execute(
+            "CREATE TABLE news_item_weeks_v1 ("
+            " profile TEXT NOT NULL,"
+            " week TEXT NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " PRIMARY KEY (profile, week, item_id)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE news_fetches_v1 ("
+            " profile TEXT NOT NULL,"
+            " week TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " items INTEGER NOT NULL,"
+            " PRIMARY KEY (profile, week))"
+        )
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "news_item_weeks" in tables:
+            conn.execute("INSERT INTO news_item_weeks_v1 SELECT ?, week, item_id FROM news_item_weeks", (profile,))
+            conn.execute("DROP TABLE news_item_weeks")
+        if "news_fetches" in tables:
+            conn.execute("INSERT INTO news_fetches_v1 SELECT ?, week, fetched_at, items FROM news_fetches", (profile,))
+            conn.execute("DROP TABLE news_fetches")
+        conn.execute("ALTER TABLE news_item_weeks_v1 RENAME TO news_item_weeks")
+        conn.execute("ALTER TABLE news_fetches_v1 RENAME TO news_fetches")
+
+    def record(self, items: list[dict], week: str, seen_at: float | None = None, profile: str = DEFAULT_PROFILE) -> dict:
+        """
+        Guarda (o actualiza) las noticias de una descarga. Devuelve cuántas eran nuevas.
+        """
+        self._ensure_ready()
+        seen_at = time.time() if seen_at is None else seen_at
+        by_id = {}
+        for it in items:
+            by_id.setdefault(news_item_id(it), it)
+        stats = {"received": len(items), "new": 0, "updated": 0}
+        with timed("archive_write"), closing(self._connect()) as conn, conn:
+            # Lectura + escritura en una sola transacción de escritura: varios perfiles
+            # pueden archivar la misma noticia a la vez
+            conn.execute("BEGIN IMMEDIATE")
+            existing = {}
+            ids = list(by_id)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                for item_id, queries in conn.execute(
+                    f"SELECT id, queries FROM news_items WHERE id IN ({marks})", chunk
+                ):
+                    existing[item_id] = json.loads(queries)
+            for item_id, it in by_id.items():
+                queries = list(it.get("queries") or [])
+                if item_id in existing:
+                    merged = existing[item_id] + [q for q in queries if q not in existing[item_id]]
+                    conn.execute(
+                        "UPDATE news_items SET last_seen = ?, queries = ? WHERE id = ?",
+                        (seen_at, json.dumps(merged, ensure_ascii=False), item_id),
+                    )
+                    stats["updated"] += 1
+                else:
+                    conn.execute(
+                        "INSERT INTO news_items (id, url, canonical_url, title, source, published, snippet,"
+                        " queries, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            item_id,
+                            it.get("url", ""),
+                            canonical_url(it.get("url", "")),
+                            it.get("title", ""),
+                            it.get("source", ""),
+                            it.get("published", ""),
+                            it.get("snippet", ""),
+                            json.dumps(queries, ensure_ascii=False),
+                            seen_at,
+                            seen_at,
+                        ),
+                    )
+                    stats["new"] += 1
+                weeks = {week, published_week(it.get("published", ""))} - {None}
+                conn.executemany(
+                    "INSERT OR IGNORE INTO news_item_weeks (profile, week, item_id) VALUES (?, ?, ?)",
+                    [(profile, w, item_id) for w in weeks],
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO news_fetches (profile, week, fetched_at, items) VALUES (?, ?, ?, ?)",
+                (profile, week, seen_at, len(by_id)),
+            )
+        record_items("archived_new", stats["new"])
+        return stats
+
+    def last_fetch(self, week: str, profile: str = DEFAULT_PROFILE):
+        """
+        (momento, nº de items) de la última descarga guardada para la semana, o None.
+        """
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT fetched_at, items FROM news_fetches WHERE profile = ? AND week = ?", (profile, week)
+            ).fetchone()
+
+    def items_for_week(
+        self, week: str, source: str | None = None, limit: int | None = None, profile: str = DEFAULT_PROFILE
+    ) -> list[dict]:
+        """
+        Noticias asociadas a una semana (opcionalmente de un medio), en el mismo
+        formato que fetch_news_feeds(), de la más reciente a la más antigua.
+        """
+        self._ensure_ready()
+        sql = (
+            "SELECT n.title, n.url, n.published, n.source, n.snippet, n.queries, n.first_seen, n.last_seen"
+            " FROM news_item_weeks w JOIN news_items n ON n.id = w.item_id"
+            " WHERE w.profile = ? AND w.week = ?"
+        )
+        params = [profile, week]
+        if source:
+            sql += " AND n.source = ?"
+            params.append(source)
+        sql += " ORDER BY n.last_seen DESC, n.first_seen DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with timed("archive_read"), closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            {
+                "title": title,
+                "url": url,
+                "published": published,
+                "source": src,
+                "snippet": snippet,
+                "queries": json.loads(queries),
+                "first_seen": datetime.fromtimestamp(first).isoformat(timespec="seconds"),
+                "last_seen": datetime.fromtimestamp(last).isoformat(timespec="seconds"),
+            }
+            for title, url, published, src, snippet, queries, first, last in rows
+        ]
+
+
+news_archive = NewsArchive(os.getenv("NEWS_ARCHIVE_DB", "news_archive.db"))
+
+
+def resolve_news_source(week: str, source: str, profile: str = DEFAULT_PROFILE) -> str:
+    """
+    "auto" -> "archive" para semanas pasadas o si la semana actual se descargó
+    hace menos de ARCHIVE_FRESH_SECONDS; si no, "network".
+    """
+    if source != "auto":
+        return source
+    last = news_archive.last_fetch(week, profile)
+    fresh = last is not None and time.time() - last[0] < archive_fresh_seconds()
+    return "archive" if week != now_week() or fresh else "network"
+
+
+def build_fallback_report(news_items: list[dict], week: str) -> dict:
+    """
+    Si OpenAI falla, generamos un informe básico con titulares + fuentes.
+    """
+    bullets = []
+    sources = []
+    for it in news_items[:8]:
+        t = it.get("title", "")
+        s = it.get("source", "")
+        bullets.append(f"{t} ({s})")
+        if it.get("url"):
+            sources.append({"url": it["url"], "note": it.get("source", "")})
+
+    return {
+        "title": "Weekly Economic Report (fallback)",
+        "week": week,
+        "executive_summary": [
+            "No se pudo generar el informe con IA (error o timeout).",
+            "Se adjunta un resumen básico de titulares y enlaces como alternativa.",
+        ],
+        "sections": [
+            {"heading": "Titulares destacados", "bullets": bullets or ["No hay titulares disponibles."]}
+        ],
+        "sources": sources,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+REPORT_INSTRUCTIONS = (
+    "IMPORTANTE: Devuelve SOLO json válido (json). No añadas texto fuera del JSON.\n\n"
+    "Eres analista del mercado inmobiliario en España. "
+    "Con la lista de noticias (titulares + snippets) redacta un INFORME SEMANAL original, claro y accionable.\n\n"
+    "Reglas:\n"
+    "- NO copies artículos ni pegues texto largo: usa el snippet solo como señal.\n"
+    "- Si un dato no aparece, dilo explícitamente; NO inventes.\n"
+    "- Secciones sugeridas: Precios, Demanda, Oferta/Stock, Financiación, Regulación, Riesgos.\n"
+    "- Incluye 'Fuentes' con enlaces.\n\n"
+    "Salida EXACTA en json con esta estructura:\n"
+    "{\n"
+    '  "title": string,\n'
+    '  "week": string,\n'
+    '  "executive_summary": [string, ...],\n'
+    '  "sections": [{"heading": string, "bullets": [string, ...]} ...],\n'
+    '  "sources": [{"url": string, "note": string} ...],\n'
+    '  "generated_at": string\n'
+    "}\n"
+)
+
+
+def format_news_items(news_items: list[dict]) -> str:
+    lines = []
+    for i, it in enumerate(news_items, start=1):
+        lines.append(
+            f"{i}. TITULAR: {it.get('title','')}\n"
+            f"   FECHA: {it.get('published','')}\n"
+            f"   MEDIO: {it.get('source','')}\n"
+            f"   LINK: {it.get('url','')}\n"
+            f"   SNIPPET: {it.get('snippet','')}\n"
+        )
+        also = [a.get("source") or a.get("url", "") for a in it.get("also_reported_by") or []]
+        if also:
+            lines[-1] += f"   TAMBIÉN EN: {', '.join(also)}\n"
+    return "\n".join(lines).strip()
+
+
+def call_openai_json(instructions: str, input_text: str, on_delta=None, deadline: Deadline | None = None) -> dict:
+    """
+    Una llamada a la Responses API pidiendo salida JSON; devuelve el JSON ya parseado.
+    Con on_delta(texto) se usa la API en streaming y se avisa de cada trozo que llega.
+    Timeout por llamada OPENAI_TIMEOUT (acotado por el deadline), reintentos con
+    jitter y circuit breaker "openai".
+    """
+
+    def once():
+        # Cupo en el limitador compartido (RPM/TPM) antes de gastar el timeout
+        estimated = estimate_tokens(instructions) + estimate_tokens(input_text) + env_int("OPENAI_EXPECTED_OUTPUT_TOKENS", 1200)
+        openai_limiter.acquire(estimated, deadline=deadline)
+        usage = None
+        timeout = deadline.cap(openai_timeout()) if deadline is not None else openai_timeout()
+        api = openai_client().with_options(timeout=timeout)
+        record_size("openai_prompt", len(instructions.encode("utf-8")) + len(input_text.encode("utf-8")))
+        with timed("openai_call"):
+            if on_delta is None:
+                resp = api.responses.create(
+                    model=openai_model(),
+                    instructions=instructions,
+                    input=input_text,
+                    text={"format": {"type": "json_object"}},
+                )
+                text = resp.output_text
+                usage = getattr(resp, "usage", None)
+            else:
+                chunks = []
+                stream = api.responses.create(
+                    model=openai_model(),
+                    instructions=instructions,
+                    input=input_text,
+                    text={"format": {"type": "json_object"}},
+                    stream=True,
+                )
+                for event in stream:
+                    if event.type == "response.output_text.delta":
+                        chunks.append(event.delta)
+                        on_delta(event.delta)
+                    elif event.type == "response.completed":
+                        usage = getattr(getattr(event, "response", None), "usage", None)
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"OpenAI stream error: {event}")
+                text = "".join(chunks)
+        openai_limiter.settle(estimated, getattr(usage, "total_tokens", None))
+        record_size("openai_response", len(text.encode("utf-8")))
+        with timed("json_parse"):
+            return json.loads(text)
+
+    return call_with_retries(once, BREAKERS["openai"], deadline=deadline, attempts=env_int("OPENAI_RETRIES", 2))
+
+
+_SECTION_RE = re.compile(
+    r'\{\s*"heading"\s*:\s*"((?:[^"\\]|\\.)*)"\s*,\s*"bullets"\s*:\s*(\[.*?\])\s*\}',
+    re.DOTALL,
+)
+
+
+def model_stream_progress(progress, every: float = 0.5):
+    """
+    Traduce los trozos de texto del modelo a eventos de progreso: tokens
+    recibidos (como mucho cada `every` segundos) y cada sección del informe
+    en cuanto su JSON está completo.
+    """
+    state = {"text": "", "chunks": 0, "sections": 0, "last": 0.0}
+
+    def on_delta(delta: str):
+        state["text"] += delta
+        state["chunks"] += 1
+        now = time.monotonic()
+        if now - state["last"] >= every:
+            state["last"] = now
+            progress("model_tokens", chunks=state["chunks"], chars=len(state["text"]))
+        found = _SECTION_RE.findall(state["text"])
+        for heading, bullets in found[state["sections"] :]:
+            try:
+                n = len(json.loads(bullets))
+            except ValueError:
+                n = None
+            progress("section_done", heading=json.loads(f'"{heading}"'), bullets=n)
+        state["sections"] = len(found)
+
+    return on_delta
+
+
+def build_report_with_openai(news_items: list[dict], week: str, on_delta=None, deadline: Deadline | None = None) -> dict:
+    """
+    Genera un informe original basado en titulares+snippets.
+    Si ya se generó un informe con las mismas noticias, prompt, modelo y semana,
+    se reutiliza de la cache (from_cache=True) sin llamar a OpenAI.
+    """
+    key = llm_cache_key(news_items, REPORT_INSTRUCTIONS, openai_model(), week)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return dict(cached, from_cache=True)
+
+    input_text = format_news_items(news_items)
+    data = call_openai_json(
+        REPORT_INSTRUCTIONS,
+        f"(json) Semana objetivo: {week}\n\nNOTICIAS:\n{input_text}",
+        on_delta=on_delta,
+        deadline=deadline,
+    )
+    data["week"] = data.get("week") or week
+    data["generated_at"] = data.get("generated_at") or datetime.now().isoformat(timespec="seconds")
+    data["title"] = data.get("title") or "Weekly Economic Report"
+
+    llm_cache.put(key, data)
+    return dict(data, from_cache=False)
+
+
+UPDATE_INSTRUCTIONS = (
+    "IMPORTANTE: Devuelve SOLO json válido (json). No añadas texto fuera del JSON.\n\n"
+    "Eres analista del mercado inmobiliario en España. Tienes el INFORME SEMANAL actual (json) "
+    "y una lista de noticias NUEVAS aparecidas después de redactarlo.\n\n"
+    "Reglas:\n"
+    "- Actualiza el informe solo con lo que aporten las noticias nuevas; no reescribas lo que no cambia.\n"
+    "- Devuelve únicamente las secciones que cambian (con todos sus bullets, no solo los nuevos).\n"
+    "- Reescribe el resumen ejecutivo si las novedades lo justifican; si no, devuélvelo vacío.\n"
+    "- Incluye en 'sources' solo los enlaces nuevos que uses.\n"
+    "- Si un dato no aparece, dilo explícitamente; NO inventes.\n\n"
+    "Salida EXACTA en json con esta estructura:\n"
+    "{\n"
+    '  "executive_summary": [string, ...],\n'
+    '  "sections": [{"heading": string, "bullets": [string, ...]} ...],\n'
+    '  "sources": [{"url": string, "note": string} ...]\n'
+    "}\n"
+)
+
+
+def update_report_with_openai(
+    report: dict, new_items: list[dict], week: str, on_delta=None, deadline: Deadline | None = None
+) -> dict:
+    """
+    Pide al modelo solo los cambios que provocan las noticias nuevas y los
+    fusiona sobre el informe existente.
+    """
+    current = {k: report.get(k) for k in ("title", "executive_summary", "sections", "sources")}
+    # El informe actual forma parte de la huella: otra base = otra respuesta
+    key = llm_cache_key(new_items, UPDATE_INSTRUCTIONS + report_fingerprint(current), openai_model(), week)
+    update = llm_cache.get(key)
+    from_cache = update is not None
+    if update is None:
+        update = call_openai_json(
+            UPDATE_INSTRUCTIONS,
+            f"(json) Semana objetivo: {week}\n\n"
+            f"INFORME ACTUAL:\n{json.dumps(current, ensure_ascii=False)}\n\n"
+            f"NOTICIAS NUEVAS:\n{format_news_items(new_items)}",
+            on_delta=on_delta,
+            deadline=deadline,
+        )
+        llm_cache.put(key, update)
+
+    merged = merge_report_update(report, update)
+    merged["from_cache"] = from_cache
+    return merged
+
+
+def merge_report_update(report: dict, update: dict) -> dict:
+    """
+    Fusiona una actualización parcial: las secciones se sustituyen por
+    encabezado (las nuevas se añaden al final) y las fuentes se unen por URL.
+    """
+    merged = dict(report)
+
+    sections = [dict(s) for s in report.get("sections") or [] if isinstance(s, dict)]
+    by_heading = {(s.get("heading") or "").strip().lower(): s for s in sections}
+    for s in update.get("sections") or []:
+        if not isinstance(s, dict) or not s.get("heading"):
+            continue
+        current = by_heading.get(s["heading"].strip().lower())
+        if current is not None:
+            current["bullets"] = s.get("bullets") or current.get("bullets") or []
+        else:
+            sections.append({"heading": s["heading"], "bullets": s.get("bullets") or []})
+    merged["sections"] = sections
+
+    if _safe_list(update.get("executive_summary")):
+        merged["executive_summary"] = update["executive_summary"]
+
+    sources = [s for s in report.get("sources") or [] if isinstance(s, dict)]
+    known = {s.get("url") for s in sources}
+    for s in update.get("sources") or []:
+        if isinstance(s, dict) and s.get("url") and s["url"] not in known:
+            known.add(s["url"])
+            sources.append(s)
+    merged["sources"] = sources
+
+    merged["generated_at"] = datetime.now().isoformat(timespec="seconds")
+    return merged
+
+
+# ---------------------------
+# Map-reduce por secciones
+# ---------------------------
+# Palabras clave (sin tildes, minúsculas) para repartir noticias entre secciones
+REPORT_SECTIONS = {
+    "Precios": ["precio", "€/m", "metro cuadrado", "encarec", "abarat", "revaloriz", "tasacion", "alquiler"],
+    "Demanda": ["demanda", "compraventa", "comprador", "ventas", "transaccion", "inversor", "inquilino"],
+    "Oferta/Stock": ["oferta", "stock", "obra nueva", "construccion", "promocion", "promotor", "visado", "suelo"],
+    "Financiación": ["hipoteca", "euribor", "tipos de interes", "tipo de interes", "bce", "credito", "financiacion", "banco"],
+    "Regulación": ["ley", "regulacion", "decreto", "normativa", "zona tensionada", "impuesto", "gobierno", "ayuntamiento"],
+    "Riesgos": ["riesgo", "burbuja", "caida", "crisis", "morosidad", "incertidumbre", "desaceleracion", "alerta"],
+}
+OTHER_SECTION = "Otras noticias"
+
+SECTION_INSTRUCTIONS = (
+    "IMPORTANTE: Devuelve SOLO json válido (json). No añadas texto fuera del JSON.\n\n"
+    "Eres analista del mercado inmobiliario en España. Redacta UNA sección de un informe semanal "
+    "a partir de las noticias (titulares + snippets) que se te dan.\n\n"
+    "Reglas:\n"
+    "- NO copies artículos ni pegues texto largo: usa el snippet solo como señal.\n"
+    "- Si un dato no aparece, dilo explícitamente; NO inventes.\n"
+    "- Entre 2 y 5 bullets concretos.\n\n"
+    "Salida EXACTA en json con esta estructura:\n"
+    "{\n"
+    '  "bullets": [string, ...],\n'
+    '  "sources": [{"url": string, "note": string} ...]\n'
+    "}\n"
+)
+
+SUMMARY_INSTRUCTIONS = (
+    "IMPORTANTE: Devuelve SOLO json válido (json). No añadas texto fuera del JSON.\n\n"
+    "Eres analista del mercado inmobiliario en España. Tienes las secciones ya redactadas de un "
+    "informe semanal. Escribe el título y un resumen ejecutivo de 3 a 5 puntos; NO inventes datos.\n\n"
+    "Salida EXACTA en json con esta estructura:\n"
+    "{\n"
+    '  "title": string,\n'
+    '  "executive_summary": [string, ...]\n'
+    "}\n"
+)
+
+
+def report_mode(n_items: int) -> str:
+    """
+    REPORT_MODE: "single" (una llamada), "map_reduce" o "auto" (map-reduce a
+    partir de MAP_REDUCE_MIN_ITEMS noticias).
+    """
+    mode = os.getenv("REPORT_MODE", "single").strip().lower()
+    if mode == "auto":
+        return "map_reduce" if n_items >= env_int("MAP_REDUCE_MIN_ITEMS", 20) else "single"
+    return "map_reduce" if mode == "map_reduce" else "single"
+
+
+def bucket_news_by_section(news_items: list[dict]) -> dict:
+    """
+    Asigna cada noticia a la sección sugerida con más coincidencias de palabras
+    clave; las que no encajan van a OTHER_SECTION.
+    """
+    buckets = {heading: [] for heading in REPORT_SECTIONS}
+    buckets[OTHER_SECTION] = []
+    for it in news_items:
+        text = _fold_text(f"{it.get('title', '')} {it.get('snippet', '')}")
+        best, best_hits = OTHER_SECTION, 0
+        for heading, keywords in REPORT_SECTIONS.items():
+            hits = sum(text.count(k) for k in keywords)
+            if hits > best_hits:
+                best, best_hits = heading, hits
+        buckets[best].append(it)
+    return buckets
+
+
+def _summarize_section(heading: str, items: list[dict], week: str, deadline: Deadline | None = None) -> dict:
+    data = call_openai_json(
+        SECTION_INSTRUCTIONS,
+        f"(json) Semana objetivo: {week}\nSección: {heading}\n\nNOTICIAS:\n{format_news_items(items)}",
+        deadline=deadline,
+    )
+    return {
+        "heading": heading,
+        "bullets": _safe_list(data.get("bullets")),
+        "sources": [s for s in data.get("sources") or [] if isinstance(s, dict)],
+    }
+
+
+def build_report_map_reduce(
+    news_items: list[dict], week: str, progress=None, deadline: Deadline | None = None
+) -> dict:
+    """
+    Map: resume cada sección en paralelo (LLM_MAP_WORKERS llamadas a la vez).
+    Reduce: una llamada corta escribe título y resumen ejecutivo.
+    La latencia total es la de la sección más lenta + el reduce, no la de un
+    prompt con todas las noticias.
+    """
+    progress = progress or (lambda stage, **info: None)
+    key = llm_cache_key(news_items, "map_reduce\n" + SECTION_INSTRUCTIONS + SUMMARY_INSTRUCTIONS, openai_model(), week)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return dict(cached, from_cache=True)
+
+    buckets = {h: items for h, items in bucket_news_by_section(news_items).items() if items or h != OTHER_SECTION}
+    results = {}
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, env_int("LLM_MAP_WORKERS", 4)), thread_name_prefix="map") as pool:
+        futures = {
+            submit_in_context(pool, _summarize_section, h, items, week, deadline): h
+            for h, items in buckets.items()
+            if items
+        }
+        for fut in as_completed(futures):
+            heading = futures[fut]
+            try:
+                results[heading] = fut.result()
+            except Exception:
+                # Una sección fallida no tira el informe: sus titulares como bullets
+                traceback.print_exc()
+                failures += 1
+                results[heading] = {
+                    "heading": heading,
+                    "bullets": [f"{it.get('title', '')} ({it.get('source', '')})" for it in buckets[heading][:5]],
+                    "sources": [{"url": it["url"], "note": it.get("source", "")} for it in buckets[heading] if it.get("url")],
+                }
+            progress("section_done", heading=heading, bullets=len(results[heading]["bullets"]))
+
+    if futures and failures == len(futures):
+        raise RuntimeError("Todas las secciones han fallado")
+
+    sections = []
+    sources = []
+    seen_urls = set()
+    for heading, items in buckets.items():
+        r = results.get(heading) or {"heading": heading, "bullets": ["Sin noticias relevantes esta semana."], "sources": []}
+        sections.append({"heading": heading, "bullets": r["bullets"] or ["Sin datos concluyentes."]})
+        for s in r["sources"]:
+            if s.get("url") and s["url"] not in seen_urls:
+                seen_urls.add(s["url"])
+                sources.append(s)
+
+    try:
+        summary = call_openai_json(
+            SUMMARY_INSTRUCTIONS,
+            f"(json) Semana objetivo: {week}\n\nSECCIONES:\n{json.dumps(sections, ensure_ascii=False)}",
+            deadline=deadline,
+        )
+    except Exception:
+        traceback.print_exc()
+        summary = {}
+
+    data = {
+        "title": summary.get("title") or "Weekly Economic Report",
+        "week": week,
+        "executive_summary": _safe_list(summary.get("executive_summary"))
+        or [s["bullets"][0] for s in sections if s["heading"] in results][:4],
+        "sections": sections,
+        "sources": sources,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    # Con secciones degradadas no se cachea: el siguiente intento puede salir bien
+    if not failures:
+        llm_cache.put(key, data)
+    return dict(data, from_cache=False)
+
+
+# ---------------------------
+# LLM cache (informes ya generados por OpenAI)
+# ---------------------------
+def llm_cache_key(news_items: list[dict], instructions: str, model: str, week: str) -> str:
+    """
+    Huella del conjunto de noticias normalizado (URL, titular, snippet) + prompt + modelo + semana.
+    El orden de las noticias no cambia la huella.
+    """
+    norm = sorted(
+        (
+            (it.get("url") or "").strip(),
+            " ".join((it.get("title") or "").split()).lower(),
+            " ".join((it.get("snippet") or "").split()).lower(),
+        )
+        for it in news_items
+    )
+    raw = json.dumps({"items": norm, "instructions": instructions, "model": model, "week": week}, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache persistente (SQLite) de respuestas JSON de OpenAI, con caducidad (TTL)
+    y un máximo de entradas (se expulsan las menos usadas).
+    """
+
+    def __init__(self, path: str, ttl: int = 7 * 24 * 3600, max_entries: int = 500):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            with self._lock, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " created REAL NOT NULL,"
+                    " last_used REAL NOT NULL,"
+                    " data TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+                self._ready = True
+        return conn
+
+    def get(self, key: str):
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT data FROM llm_cache WHERE key = ? AND created > ?", (key, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    record_cache("llm", "miss")
+                    return None
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            record_cache("llm", "hit")
+            return json.loads(row[0])
+        except Exception:
+            # La cache nunca debe tumbar la generación
+            traceback.print_exc()
+            return None
+
+    def put(self, key: str, data: dict):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created, last_used, data) VALUES (?, ?, ?, ?)",
+                    (key, now, now, json.dumps(data, ensure_ascii=False, default=str)),
+                )
+                conn.execute("DELETE FROM llm_cache WHERE created <= ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except Exception:
+            traceback.print_exc()
+
+
+llm_cache = LLMCache(
+    os.getenv("LLM_CACHE_DB", "llm_cache.db"),
+    ttl=env_int("LLM_CACHE_TTL", 7 * 24 * 3600),
+    max_entries=env_int("LLM_CACHE_MAX_ENTRIES", 500),
+)
+
+
+# ---------------------------
+# Compactación de noticias (antes del LLM)
+# ---------------------------
+_MINHASH_PERMUTATIONS = 64
+_MINHASH_PRIME = (1 << 61) - 1
+_MINHASH_SEEDS = [
+    (int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], "big") % _MINHASH_PRIME or 1,
+     int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], "big") % _MINHASH_PRIME)
+    for i in range(_MINHASH_PERMUTATIONS)
+]
+
+
+def _fold_text(s: str) -> str:
+    # minúsculas y sin tildes: "Euríbor" y "euribor" cuentan igual
+    s = unicodedata.normalize("NFKD", s or "").lower()
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+
+def _shingles(text: str, k: int = 3) -> set:
+    words = re.findall(r"\w+", _fold_text(text))
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+def _minhash(shingles: set) -> list[int]:
+    if not shingles:
+        return []
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return [min((a * h + b) % _MINHASH_PRIME for h in hashes) for a, b in _MINHASH_SEEDS]
+
+
+def _minhash_similarity(a: list[int], b: list[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximación barata (~4 caracteres por token); suficiente para presupuestar
+    return (len(text) + 3) // 4
+
+
+def _trim_words(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 1:
+        return ""
+    cut = text[: max_chars - 1].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def compact_news_items(
+    news_items: list[dict],
+    token_budget: int | None = None,
+    threshold: float | None = None,
+) -> tuple[list[dict], dict]:
+    """
+    Agrupa noticias casi duplicadas (el mismo teletipo en varios medios) con
+    shingles + MinHash sobre titular y snippet, se queda con un representante
+    por grupo (con la lista de medios) y recorta snippets hasta caber en el
+    presupuesto de tokens del prompt.
+
+    Devuelve (items compactados, estadísticas).
+    """
+    token_budget = prompt_token_budget() if token_budget is None else token_budget
+    threshold = news_dedup_threshold() if threshold is None else threshold
+    tokens_before = estimate_tokens(format_news_items(news_items))
+
+    clusters = []  # [(firma, [items])]
+    for it in news_items:
+        sig = _minhash(_shingles(f"{it.get('title', '')} {it.get('snippet', '')}"))
+        for rep_sig, members in clusters:
+            if _minhash_similarity(sig, rep_sig) >= threshold:
+                members.append(it)
+                break
+        else:
+            clusters.append((sig, [it]))
+
+    compacted = []
+    for _, members in clusters:
+        # Representante: el que trae más contexto; el orden del feed se respeta
+        best = max(members, key=lambda x: len(x.get("snippet") or ""))
+        rep = dict(best)
+        if len(members) > 1:
+            rep["also_reported_by"] = [
+                {"source": m.get("source", ""), "url": m.get("url", "")} for m in members if m is not best
+            ]
+        compacted.append(rep)
+
+    if token_budget > 0 and estimate_tokens(format_news_items(compacted)) > token_budget:
+        overhead = estimate_tokens(format_news_items([dict(it, snippet="") for it in compacted]))
+        # Si ni sin snippets cabe, se caen las últimas noticias (las menos relevantes del feed)
+        while len(compacted) > 1 and overhead > token_budget:
+            compacted.pop()
+            overhead = estimate_tokens(format_news_items([dict(it, snippet="") for it in compacted]))
+        per_item = max(0, (token_budget - overhead) * 4 // max(1, len(compacted)))
+        for it in compacted:
+            it["snippet"] = _trim_words(it.get("snippet") or "", per_item)
+
+    tokens_after = estimate_tokens(format_news_items(compacted))
+    stats = {
+        "items_in": len(news_items),
+        "items_out": len(compacted),
+        "duplicates_collapsed": len(news_items) - len(clusters),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+    }
+    return compacted, stats
+
+
+def compacted_urls(compacted: list[dict]) -> set:
+    # URLs que sí llegaron al modelo: los representantes y sus duplicados (no los
+    # que se cayeron por el presupuesto, que deben entrar en la próxima ejecución)
+    urls = set()
+    for it in compacted:
+        urls.add(it.get("url"))
+        urls.update(a.get("url") for a in it.get("also_reported_by") or [])
+    urls.discard(None)
+    urls.discard("")
+    return urls
+
+
+# ---------------------------
+# PDF cache (LRU en memoria + disco)
+# ---------------------------
+def report_fingerprint(data: dict) -> str:
+    """
+    Hash estable del contenido de un informe (sirve de clave de cache y de ETag).
+    """
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """
+    PDFs ya renderizados, indexados por la huella del informe.
+    Primer nivel: LRU acotada en memoria. Segundo nivel: ficheros en disco
+    (sobreviven a reinicios y se comparten entre workers), también LRU: leer un
+    PDF actualiza su mtime y, al pasar de max_disk_bytes, se borran los de
+    mtime más antiguo.
+    """
+
+    def __init__(self, directory: str, max_items: int = 16, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_items = max(1, max_items)
+        self.max_disk_bytes = max(0, max_disk_bytes)
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str, memory: bool = True):
+        """
+        memory=False: no sube a la LRU en memoria lo que se lee de disco (para
+        recorridos masivos como /api/export, que la vaciarían).
+        """
+        with self._lock:
+            pdf = self._mem.get(key)
+            if pdf is not None:
+                self._mem.move_to_end(key)
+                return pdf
+        try:
+            with open(self._path(key), "rb") as f:
+                pdf = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            return None
+        if memory:
+            self._remember(key, pdf)
+        return pdf
+
+    def put(self, key: str, pdf: bytes, memory: bool = True):
+        if memory:
+            self._remember(key, pdf)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Nombre temporal único: dos workers pueden renderizar la misma semana a la vez
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{key}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(pdf)
+                os.replace(tmp, self._path(key))
+            except OSError:
+                with suppress(OSError):
+                    os.remove(tmp)
+                raise
+            self._prune_disk()
+        except OSError:
+            # Sin disco seguimos con la cache en memoria
+            pass
+
+    def _prune_disk(self):
+        files = []
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if e.name.endswith(".pdf"):
+                    with suppress(OSError):
+                        st = e.stat()
+                        files.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            with suppress(OSError):
+                os.remove(path)
+            total -= size
+
+    def _remember(self, key: str, pdf: bytes):
+        with self._lock:
+            self._mem[key] = pdf
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+
+pdf_cache = PdfCache(
+    os.getenv("PDF_CACHE_DIR", "pdf_cache"),
+    max_items=env_int("PDF_CACHE_MAX_ITEMS", 16),
+    max_disk_bytes=env_int("PDF_CACHE_MAX_MB", 256) * 1024 * 1024,
+)
+
+
+# ---------------------------
+# Persistence + generator
+# ---------------------------
+class ReportStore:
+    """
+    Almacén de informes en SQLite, indexado por (perfil, semana).
+
+    Cada semana es una fila: guardar un informe es un INSERT atómico (un fallo
+    a mitad de escritura no rompe el resto del histórico) y leer una semana no
+    obliga a cargar todas. En memoria solo se mantiene un conjunto acotado de
+    semanas recientes (LRU).
+
+    Con varios workers de gunicorn, cada escritura toca un fichero de versión
+    (<db>.version); los demás procesos comparan su stat() y, si ha cambiado,
+    vacían su cache en memoria. Así ven los informes nuevos sin releer nada.
+
+    El esquema se versiona con PRAGMA user_version y se migra al abrir.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: str, legacy_json: str | None = None, hot_max: int = 8):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.hot_max = max(1, hot_max)
+        self.version_file = path + ".version"
+        # Se incrementa cada vez que se descarta la cache por cambios de otro proceso
+        self.generation = 0
+        self._seen_version = None
+        self._hot = OrderedDict()
+        self._latest_week = {}
+        self._ready = False
+        self._lock = threading.RLock()
+
+    def _stat_version(self):
+        try:
+            st = os.stat(self.version_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def sync(self) -> bool:
+        """
+        Descarta la cache en memoria si otro proceso ha escrito. Devuelve True si
+        había cambios. Solo cuesta un stat().
+        """
+        version = self._stat_version()
+        if version == self._seen_version:
+            return False
+        with self._lock:
+            if version == self._seen_version:
+                return False
+            self._seen_version = version
+            self._hot.clear()
+            self._latest_week.clear()
+            self.generation += 1
+        return True
+
+    def _bump_version(self):
+        # Bajo flock: entre el sync() y el stat() final ningún otro worker puede
+        # reemplazar el fichero, así que no se da por vista una escritura ajena
+        directory = os.path.dirname(self.version_file) or "."
+        try:
+            with open(self.version_file + ".lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self.sync()
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=".reports-version-", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        f.write(str(time.time_ns()))
+                    os.replace(tmp, self.version_file)
+                except OSError:
+                    with suppress(OSError):
+                        os.remove(tmp)
+                    raise
+                version = self._stat_version()
+        except OSError:
+            traceback.print_exc()
+            return
+        with self._lock:
+            # Nuestra propia escritura ya está reflejada en memoria
+            self._seen_version = version
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version < 1:
+                        self._migrate_v1(conn)
+                    conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                    empty = conn.execute("SELECT 1 FROM reports LIMIT 1").fetchone() is None
+                    if empty and version < 1:
+                        self._import_legacy(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            self._ready = True
+
+    def _migrate_v1(self, conn: sqlite3.Connection):
+        # v0 (una fila por semana) -> v1 (clave perfil + semana); lo existente va al perfil por defecto
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports_v1 ("
+            " profile TEXT NOT NULL,"
+            " week TEXT NOT NULL,"
+            " timestamp TEXT NOT NULL,"
+            " entry TEXT NOT NULL,"
+            " PRIMARY KEY (profile, week)) WITHOUT ROWID"
+        )
+        old = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports'").fetchone()
+        if old is not None:
+            n = conn.execute(
+                "INSERT OR REPLACE INTO reports_v1 (profile, week, timestamp, entry)"
+                " SELECT ?, week, timestamp, entry FROM reports",
+                (default_profile_name(),),
+            ).rowcount
+            conn.execute("DROP TABLE reports")
+            log.info("Esquema v1 de informes: %d semanas asignadas al perfil %r", n, default_profile_name())
+        conn.execute("ALTER TABLE reports_v1 RENAME TO reports")
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        # Migración única desde el antiguo reports.json (si existe)
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except Exception:
+            traceback.print_exc()
+            return
+        profile = default_profile_name()
+        rows = [
+            (profile, week, str(entry.get("timestamp", "")), json.dumps(entry, ensure_ascii=False, default=str))
+            for week, entry in legacy.items()
+            if isinstance(entry, dict)
+        ]
+        conn.executemany(
+            "INSERT OR REPLACE INTO reports (profile, week, timestamp, entry) VALUES (?, ?, ?, ?)", rows
+        )
+        log.info("Migradas %d semanas de informes desde %s", len(rows), self.legacy_json)
+
+    def _remember(self, key: tuple, entry: dict):
+        with self._lock:
+            self._hot[key] = entry
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_max:
+                self._hot.popitem(last=False)
+
+    def get(self, week: str, profile: str = DEFAULT_PROFILE):
+        self.sync()
+        key = (profile, week)
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                self._hot.move_to_end(key)
+                return entry
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT entry FROM reports WHERE profile = ? AND week = ?", key).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row[0])
+        self._remember(key, entry)
+        return entry
+
+    def put(self, week: str, entry: dict, profile: str = DEFAULT_PROFILE):
+        self._ensure_ready()
+        raw = json.dumps(entry, ensure_ascii=False, default=str)
+        record_size("save", len(raw.encode("utf-8")))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (profile, week, timestamp, entry) VALUES (?, ?, ?, ?)",
+                (profile, week, str(entry.get("timestamp", "")), raw),
+            )
+        self.sync()
+        self._remember((profile, week), entry)
+        with self._lock:
+            latest = self._latest_week.get(profile)
+            if latest is not None and week >= latest:
+                self._latest_week[profile] = week
+        self._bump_version()
+
+    def latest_week(self, profile: str = DEFAULT_PROFILE):
+        """
+        Semana más reciente del perfil (búsqueda por índice, sin recorrer el histórico).
+        """
+        self.sync()
+        latest = self._latest_week.get(profile)
+        if latest is not None:
+            return latest
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT week FROM reports WHERE profile = ? ORDER BY week DESC LIMIT 1", (profile,)
+            ).fetchone()
+        with self._lock:
+            latest = self._latest_week.get(profile)
+            if row is not None and (latest is None or row[0] > latest):
+                self._latest_week[profile] = row[0]
+        return self._latest_week.get(profile)
+
+    def weeks(self, profile: str = DEFAULT_PROFILE) -> list[str]:
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            return [r[0] for r in conn.execute("SELECT week FROM reports WHERE profile = ? ORDER BY week", (profile,))]
+
+    def iter_entries(self, profile: str = DEFAULT_PROFILE):
+        """
+        (semana, entrada) de todo el histórico del perfil, por orden, sin pasar por la cache.
+        """
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            for week, raw in conn.execute(
+                "SELECT week, entry FROM reports WHERE profile = ? ORDER BY week", (profile,)
+            ):
+                yield week, json.loads(raw)
+
+    def page(
+        self,
+        profile: str = DEFAULT_PROFILE,
+        after: str | None = None,
+        limit: int = 20,
+        descending: bool = True,
+        week_from: str | None = None,
+        week_to: str | None = None,
+    ) -> list[tuple]:
+        """
+        Hasta `limit` semanas (semana, entrada) a continuación de `after`, en el
+        orden pedido. Paginación por clave (keyset): cada página es una búsqueda
+        por índice, no un OFFSET que recorre todas las semanas anteriores.
+        """
+        self._ensure_ready()
+        sql = "SELECT week, entry FROM reports WHERE profile = ?"
+        args = [profile]
+        if after is not None:
+            sql += " AND week < ?" if descending else " AND week > ?"
+            args.append(after)
+        if week_from:
+            sql += " AND week >= ?"
+            args.append(week_from)
+        if week_to:
+            sql += " AND week <= ?"
+            args.append(week_to)
+        sql += f" ORDER BY week {'DESC' if descending else 'ASC'} LIMIT ?"
+        args.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [(week, json.loads(raw)) for week, raw in rows]
+
+
+# ---------------------------
+# Búsqueda (índice invertido)
+# ---------------------------
+SPANISH_STOPWORDS = frozenset(
+    """
+    a al algo algunas algunos ante antes como con contra cual cuando de del desde donde durante e el ella
+    ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos fue fueron ha han hasta hay
+    la las le les lo los mas me mi mientras muy ni no nos o os otra otras otro otros para pero poco por porque
+    que quien se ser si sin sobre su sus tambien tan te tiene tienen todo todos tras un una unas uno unos y ya
+    """.split()
+)
+
+# Peso de cada tipo de fragmento en el ranking
+SEARCH_KIND_WEIGHTS = {"section": 1.5, "summary": 1.2, "bullet": 1.0, "source": 0.8, "headline": 0.8}
+
+
+def _stem_es(token: str) -> str:
+    # Plurales regulares: "hipotecas" -> "hipoteca", "alquileres" -> "alquiler"
+    if len(token) > 5 and token.endswith("es") and token[-3] in "lrndjz":
+        return token[:-2]
+    if len(token) > 4 and token.endswith("s") and not token[-2].isdigit():
+        return token[:-1]
+    return token
+
+
+def search_tokens(text: str) -> list[str]:
+    """
+    Tokens normalizados para el índice: sin tildes, minúsculas, sin stopwords
+    y con los plurales regulares reducidos ("Euríbor" == "euribor").
+    """
+    return [
+        _stem_es(t)
+        for t in re.findall(r"[a-z0-9ñ]+", _fold_text(text))
+        if t not in SPANISH_STOPWORDS and (len(t) > 1 or t.isdigit())
+    ]
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def report_search_docs(entry: dict) -> list[dict]:
+    """
+    Fragmentos indexables de una entrada: resumen, secciones, bullets, notas de
+    fuentes y titulares de las noticias usadas.
+    """
+    data = entry.get("data") or {}
+    docs = []
+    for text in _safe_list(data.get("executive_summary")):
+        docs.append({"kind": "summary", "heading": "", "text": str(text), "url": ""})
+    for sec in _as_list(data.get("sections")):
+        if not isinstance(sec, dict):
+            continue
+        heading = str(sec.get("heading") or "")
+        if heading:
+            docs.append({"kind": "section", "heading": heading, "text": heading, "url": ""})
+        for b in _as_list(sec.get("bullets")):
+            docs.append({"kind": "bullet", "heading": heading, "text": str(b), "url": ""})
+    for src in _as_list(data.get("sources")):
+        if isinstance(src, dict) and (src.get("note") or src.get("url")):
+            docs.append({"kind": "source", "heading": "", "text": str(src.get("note") or ""), "url": str(src.get("url") or "")})
+    for h in _as_list(entry.get("headlines")):
+        if isinstance(h, dict) and h.get("title"):
+            text = h["title"] + (f" ({h['source']})" if h.get("source") else "")
+            docs.append({"kind": "headline", "heading": "", "text": text, "url": str(h.get("url") or "")})
+    return docs
+
+
+class SearchIndex:
+    """
+    Índice invertido de los informes, en las mismas tablas SQLite que el store.
+
+    Cada fragmento (bullet, sección, fuente, titular...) es un documento; las
+    postings (término, documento, frecuencia) tienen clave primaria por término,
+    así que una búsqueda solo lee las filas de sus términos, crezca lo que crezca
+    el histórico. Al guardar una semana se reemplazan solo sus documentos.
+    """
+
+    def __init__(self, store: ReportStore):
+        self.store = store
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            self.store._ensure_ready()
+            with closing(self.store._connect()) as conn:
+                conn.executescript(
+                    "CREATE TABLE IF NOT EXISTS search_docs ("
+                    " id INTEGER PRIMARY KEY,"
+                    " week TEXT NOT NULL,"
+                    " kind TEXT NOT NULL,"
+                    " heading TEXT NOT NULL,"
+                    " text TEXT NOT NULL,"
+                    " url TEXT NOT NULL,"
+                    " length INTEGER NOT NULL);"
+                    "CREATE INDEX IF NOT EXISTS search_docs_week ON search_docs (week);"
+                    "CREATE TABLE IF NOT EXISTS search_postings ("
+                    " term TEXT NOT NULL,"
+                    " doc_id INTEGER NOT NULL,"
+                    " tf INTEGER NOT NULL,"
+                    " PRIMARY KEY (term, doc_id)) WITHOUT ROWID;"
+                    "CREATE INDEX IF NOT EXISTS search_postings_doc ON search_postings (doc_id);"
+                    "CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                )
+                columns = {r[1] for r in conn.execute("PRAGMA table_info(search_docs)")}
+                if "profile" not in columns:
+                    # Índices creados antes de los perfiles: todo era del perfil por defecto
+                    conn.execute(
+                        "ALTER TABLE search_docs ADD COLUMN profile TEXT NOT NULL DEFAULT "
+                        + "'" + default_profile_name() + "'"
+                    )
+                conn.execute("CREATE INDEX IF NOT EXISTS search_docs_profile_week ON search_docs (profile, week)")
+                conn.commit()
+                self._backfill(conn)
+            self._ready = True
+
+    def _backfill(self, conn: sqlite3.Connection):
+        # Histórico anterior al índice (o migrado de reports.json): se indexa una vez
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM search_meta WHERE key = 'backfilled'").fetchone() is None:
+                n = 0
+                for profile, week, raw in conn.execute("SELECT profile, week, entry FROM reports").fetchall():
+                    self._replace_week(conn, profile, week, json.loads(raw))
+                    n += 1
+                conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('backfilled', 1)")
+                if n:
+                    log.info("Índice de búsqueda: indexadas %d semanas existentes", n)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _replace_week(self, conn: sqlite3.Connection, profile: str, week: str, entry: dict):
+        old = [
+            r[0] for r in conn.execute("SELECT id FROM search_docs WHERE profile = ? AND week = ?", (profile, week))
+        ]
+        if old:
+            marks = ",".join("?" * len(old))
+            conn.execute(f"DELETE FROM search_postings WHERE doc_id IN ({marks})", old)
+            conn.execute(f"DELETE FROM search_docs WHERE id IN ({marks})", old)
+            conn.execute("UPDATE search_meta SET value = value - ? WHERE key = 'docs'", (len(old),))
+        added = 0
+        for doc in report_search_docs(entry):
+            tokens = search_tokens(doc["text"])
+            if not tokens:
+                continue
+            cur = conn.execute(
+                "INSERT INTO search_docs (profile, week, kind, heading, text, url, length)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (profile, week, doc["kind"], doc["heading"], doc["text"], doc["url"], len(tokens)),
+            )
+            tf = {}
+            for t in tokens:
+                tf[t] = tf.get(t, 0) + 1
+            conn.executemany(
+                "INSERT INTO search_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(t, cur.lastrowid, n) for t, n in tf.items()],
+            )
+            added += 1
+        conn.execute("INSERT OR IGNORE INTO search_meta (key, value) VALUES ('docs', 0)")
+        conn.execute("UPDATE search_meta SET value = value + ? WHERE key = 'docs'", (added,))
+
+    def index_week(self, week: str, entry: dict, profile: str = DEFAULT_PROFILE):
+        self._ensure_ready()
+        with timed("search_index"), closing(self.store._connect()) as conn, conn:
+            self._replace_week(conn, profile, week, entry)
+
+    def search(
+        self, query: str, page: int = 1, per_page: int = 10, week_from=None, week_to=None, profile: str = DEFAULT_PROFILE
+    ) -> dict:
+        """
+        Semanas que contienen todos los términos de la consulta, ordenadas por
+        TF-IDF (sumando sus fragmentos), con los mejores fragmentos de cada una.
+        """
+        self._ensure_ready()
+        terms = list(dict.fromkeys(search_tokens(query)))
+        result = {"query": query, "profile": profile, "terms": terms, "page": page, "per_page": per_page, "total": 0, "results": []}
+        if not terms:
+            return result
+
+        with timed("search_query"), closing(self.store._connect()) as conn:
+            row = conn.execute("SELECT value FROM search_meta WHERE key = 'docs'").fetchone()
+            n_docs = max(1, row[0] if row else 0)
+            weeks = {}
+            for term in terms:
+                rows = conn.execute(
+                    "SELECT d.id, d.week, d.kind, d.length, p.tf"
+                    " FROM search_postings p JOIN search_docs d ON d.id = p.doc_id"
+                    " WHERE p.term = ? AND d.profile = ?"
+                    + (" AND d.week >= ?" if week_from else "")
+                    + (" AND d.week <= ?" if week_to else ""),
+                    [term, profile] + [w for w in (week_from, week_to) if w],
+                ).fetchall()
+                if not rows:
+                    return result
+                idf = math.log(1 + n_docs / len(rows))
+                for doc_id, week, kind, length, tf in rows:
+                    score = (1 + math.log(tf)) * idf * SEARCH_KIND_WEIGHTS.get(kind, 1.0) / math.sqrt(length)
+                    w = weeks.setdefault(week, {"terms": set(), "docs": {}})
+                    w["terms"].add(term)
+                    w["docs"][doc_id] = w["docs"].get(doc_id, 0.0) + score
+
+            matching = [
+                (sum(w["docs"].values()), week, w["docs"])
+                for week, w in weeks.items()
+                if len(w["terms"]) == len(terms)
+            ]
+            matching.sort(key=lambda m: (-m[0], m[1]))
+            result["total"] = len(matching)
+            page_rows = matching[(page - 1) * per_page : page * per_page]
+
+            best_ids = {
+                week: sorted(docs, key=lambda d: -docs[d])[:3] for _, week, docs in page_rows
+            }
+            ids = [i for v in best_ids.values() for i in v]
+            details = {}
+            if ids:
+                marks = ",".join("?" * len(ids))
+                for doc_id, kind, heading, text, url in conn.execute(
+                    f"SELECT id, kind, heading, text, url FROM search_docs WHERE id IN ({marks})", ids
+                ):
+                    details[doc_id] = {"kind": kind, "heading": heading, "text": text, "url": url}
+
+        for score, week, docs in page_rows:
+            result["results"].append(
+                {
+                    "week": week,
+                    "score": round(score, 4),
+                    "matches": [dict(details[i], score=round(docs[i], 4)) for i in best_ids[week] if i in details],
+                }
+            )
+        return result
+
+
+# ---------------------------
+# Tendencias (indicadores numéricos por semana)
+# ---------------------------
+# Número en formato español: 5.200 / 7.412 / 2,17 / 1.234,5
+_NUM = r"(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?)"
+
+# indicador -> (patrones sobre texto sin tildes y en minúsculas, rango válido)
+TREND_PATTERNS = {
+    "price_m2": (
+        [re.compile(_NUM + r"\s*(?:€|euros?)\s*(?:/|por |el |al )\s*(?:m2|metro cuadrado)")],
+        (300, 30000),
+    ),
+    "euribor": (
+        [
+            re.compile(r"euribor[^%;]{0,80}?" + _NUM + r"\s*%"),
+            re.compile(_NUM + r"\s*%[^;.]{0,30}?\beuribor"),
+        ],
+        (-1, 10),
+    ),
+    "compraventas": (
+        [
+            re.compile(_NUM + r"\s+(?:compraventas|operaciones de compraventa|viviendas vendidas)"),
+            re.compile(
+                r"compraventas?(?: de viviendas?)?\s+(?:alcanz\w+|sum\w+|lleg\w+ a|ascend\w+ a|fueron)\s+(?:las?\s+)?"
+                + _NUM
+                + r"(?!\s*%|\d)"
+            ),
+        ],
+        (10, 10_000_000),
+    ),
+}
+TREND_INDICATORS = tuple(TREND_PATTERNS)
+
+
+def _parse_es_number(raw: str) -> float:
+    return float(raw.replace(".", "").replace(",", "."))
+
+
+def _indicator_mentions(texts) -> dict:
+    found = {name: [] for name in TREND_INDICATORS}
+    for text in texts:
+        folded = _fold_text(str(text))
+        for name, (patterns, (lo, hi)) in TREND_PATTERNS.items():
+            for pattern in patterns:
+                for m in pattern.finditer(folded):
+                    value = _parse_es_number(m.group(1))
+                    if lo <= value <= hi:
+                        found[name].append(value)
+    return found
+
+
+def extract_indicators(report: dict, news_items: list[dict] = (), previous: dict | None = None) -> dict:
+    """
+    Indicadores numéricos de una semana: mediana de las menciones en los
+    bullets del informe o, si el informe no da la cifra, en los snippets de las
+    noticias. Lo que no aparezca se conserva de `previous` (ejecución anterior
+    de la misma semana).
+    """
+    report_texts = list(_safe_list(report.get("executive_summary")))
+    for sec in _as_list(report.get("sections")):
+        if isinstance(sec, dict):
+            report_texts.extend(_safe_list(sec.get("bullets")))
+    news_texts = [f"{it.get('title', '')}. {it.get('snippet', '')}" for it in news_items or []]
+
+    from_report = _indicator_mentions(report_texts)
+    from_news = _indicator_mentions(news_texts)
+    out = {}
+    for name in TREND_INDICATORS:
+        values, origin = (from_report[name], "report") if from_report[name] else (from_news[name], "news")
+        if values:
+            out[name] = {"value": statistics.median(values), "mentions": len(values), "from": origin}
+        elif previous and name in previous:
+            out[name] = previous[name]
+    return out
+
+
+def _week_key(week: str) -> int:
+    # "2025-W07" -> 202507 (ordenable)
+    return int(week[:4]) * 100 + int(week[6:8])
+
+
+def _week_day(week: str) -> int:
+    # Ordinal del lunes de la semana (%W): semanas consecutivas distan 7
+    monday = datetime.strptime(week + "-1", "%Y-W%W-%w")
+    return monday.toordinal()
+
+
+class TrendStore:
+    """
+    Series temporales de indicadores por perfil, en columnas NumPy: "weeks"
+    (AAAAWW), "days" (ordinal del lunes) y un float64 por indicador, con NaN
+    donde no hay dato.
+
+    En disco, por perfil: una instantánea .npz y un log de filas (NDJSON) al que
+    cada semana guardada solo añade una línea. Al leer se aplica el log sobre la
+    instantánea (cada worker lee únicamente las líneas nuevas) y, cada
+    TRENDS_COMPACT_ROWS filas, el log se vuelca en un .npz nuevo. Escrituras y
+    compactación van bajo flock, así que workers y scheduler no se pisan.
+    """
+
+    def __init__(self, directory: str, compact_rows: int = 64):
+        self.directory = directory
+        self.compact_rows = max(1, compact_rows)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _path(self, profile: str, ext: str = "npz") -> str:
+        return os.path.join(self.directory, f"trends-{profile}.{ext}")
+
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @contextmanager
+    def _file_lock(self, profile: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path(profile, "lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _empty() -> dict:
+        import numpy as np
+
+        cols = {"weeks": np.empty(0, dtype=np.int32), "days": np.empty(0, dtype=np.int32)}
+        for name in TREND_INDICATORS:
+            cols[name] = np.empty(0, dtype=np.float64)
+        return cols
+
+    @staticmethod
+    def _apply(cols: dict, rows: list[dict]) -> dict:
+        """
+        Inserta/actualiza filas {"week", "values"} (idempotente: reaplicar no cambia nada).
+        """
+        import numpy as np
+
+        cols = {k: v.copy() for k, v in cols.items()}
+        for row in rows:
+            key = _week_key(row["week"])
+            i = int(np.searchsorted(cols["weeks"], key))
+            values = {name: row["values"].get(name) for name in TREND_INDICATORS}
+            values = {name: np.nan if v is None else float(v) for name, v in values.items()}
+            if i < len(cols["weeks"]) and cols["weeks"][i] == key:
+                for name, value in values.items():
+                    cols[name][i] = value
+            else:
+                cols["weeks"] = np.insert(cols["weeks"], i, key)
+                cols["days"] = np.insert(cols["days"], i, _week_day(row["week"]))
+                for name, value in values.items():
+                    cols[name] = np.insert(cols[name], i, value)
+        return cols
+
+    def _read_log(self, profile: str, offset: int):
+        """
+        Filas del log a partir de `offset` (solo líneas completas) y el nuevo offset.
+        """
+        try:
+            with open(self._path(profile, "log"), "rb") as f:
+                f.seek(offset)
+                raw = f.read()
+        except FileNotFoundError:
+            return [], 0
+        complete = raw[: raw.rfind(b"\n") + 1]
+        rows = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        return rows, offset + len(complete)
+
+    def _load(self, profile: str):
+        """
+        Columnas del perfil, o None si aún no hay nada guardado.
+        """
+        import numpy as np
+
+        snapshot = self._stat(self._path(profile))
+        log = self._stat(self._path(profile, "log"))
+        cached = self._cache.get(profile)
+        if cached is not None and cached[0] == snapshot and cached[1] <= (log[1] if log else 0):
+            _, offset, n_rows, cols = cached
+            if log is None or log[1] == offset:
+                return cols
+            rows, offset = self._read_log(profile, offset)
+            cols = self._apply(cols, rows)
+            self._cache[profile] = (snapshot, offset, n_rows + len(rows), cols)
+            return cols
+        if snapshot is None and log is None:
+            return None
+        cols = self._empty()
+        if snapshot is not None:
+            with np.load(self._path(profile)) as data:
+                for key in data.files:
+                    cols[key] = data[key]
+            n = len(cols["weeks"])
+            for name in TREND_INDICATORS:
+                if len(cols[name]) != n:
+                    # Indicador nuevo: columna vacía
+                    cols[name] = np.full(n, np.nan)
+        rows, offset = self._read_log(profile, 0)
+        cols = self._apply(cols, rows)
+        self._cache[profile] = (snapshot, offset, len(rows), cols)
+        return cols
+
+    def _write_snapshot(self, profile: str, cols: dict):
+        # Se llama con el flock cogido: .npz nuevo (atómico) y log vacío
+        import numpy as np
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".trends-{profile}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **cols)
+            os.replace(tmp, self._path(profile))
+        except BaseException:
+            with suppress(OSError):
+                os.remove(tmp)
+            raise
+        open(self._path(profile, "log"), "wb").close()
+        self._cache.pop(profile, None)
+
+    def update(self, profile: str, week: str, indicators: dict):
+        row = {"week": week, "values": {name: v["value"] for name, v in indicators.items() if name in TREND_PATTERNS}}
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        with timed("trends_update"), self._file_lock(profile):
+            fd = os.open(self._path(profile, "log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            cols = self._load(profile)
+            if self._cache[profile][2] >= self.compact_rows:
+                self._write_snapshot(profile, cols)
+
+    def rebuild(self, profile: str, store: ReportStore) -> int:
+        """
+        Reconstruye la serie del perfil desde el histórico (solo bullets del informe,
+        o los indicadores ya extraídos si la entrada los tiene).
+        """
+        rows = []
+        for week, entry in store.iter_entries(profile):
+            if not WEEK_RE.match(week):
+                continue
+            indicators = entry.get("indicators") or extract_indicators(entry.get("data") or {})
+            rows.append({"week": week, "values": {name: v["value"] for name, v in indicators.items()}})
+        with self._file_lock(profile):
+            self._write_snapshot(profile, self._apply(self._empty(), rows))
+        return len(rows)
+
+    def columns(self, profile: str, store: ReportStore | None = None):
+        cols = self._load(profile)
+        if cols is None and store is not None:
+            self.rebuild(profile, store)
+            cols = self._load(profile)
+        return cols if cols is not None else self._empty()
+
+
+def trend_series(cols: dict, names, week_from=None, week_to=None, window: int = 4) -> dict:
+    """
+    Serie de cada indicador entre from y to con:
+
+    - moving_average: media de los datos de las `window` semanas de calendario
+      que acaban en cada semana (incluidas las anteriores a from; las semanas
+      sin informe o sin dato no cuentan).
+    - wow_delta / wow_pct: variación frente a la semana anterior, solo si hay
+      informe de esa semana.
+
+    Vectorizado: sumas acumuladas sobre toda la serie en vez de bucles.
+    """
+    import numpy as np
+
+    all_weeks = cols["weeks"]
+    days = cols["days"]
+    lo = np.searchsorted(all_weeks, _week_key(week_from)) if week_from else 0
+    hi = np.searchsorted(all_weeks, _week_key(week_to), side="right") if week_to else len(all_weeks)
+    weeks = all_weeks[lo:hi]
+    consecutive = np.concatenate(([False], np.diff(days) == 7))
+    idx = np.arange(len(all_weeks))
+    # Primera fila de la ventana: semanas cuyo lunes está a menos de `window` semanas
+    start = np.searchsorted(days, days - 7 * (window - 1))
+
+    def as_json(a):
+        a = a[lo:hi]
+        return np.where(np.isnan(a), None, np.round(a, 4)).tolist()
+
+    out = {}
+    for name in names:
+        v = cols[name]
+        valid = ~np.isnan(v)
+        csum = np.concatenate(([0.0], np.cumsum(np.where(valid, v, 0.0))))
+        ccount = np.concatenate(([0], np.cumsum(valid)))
+        n = ccount[idx + 1] - ccount[start]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ma = np.where(n > 0, (csum[idx + 1] - csum[start]) / n, np.nan)
+            prev = np.concatenate(([np.nan], v[:-1]))
+            delta = np.where(consecutive, v - prev, np.nan)
+            pct = np.where(consecutive & (prev != 0), delta / prev * 100, np.nan)
+        last = np.flatnonzero(valid[lo:hi])
+        out[name] = {
+            "values": as_json(v),
+            "moving_average": as_json(ma),
+            "wow_delta": as_json(delta),
+            "wow_pct": as_json(pct),
+            "observations": int(valid[lo:hi].sum()),
+            "latest": {"week": _week_label(int(weeks[last[-1]])), "value": float(v[lo:hi][last[-1]])} if len(last) else None,
+        }
+    return {"weeks": [_week_label(int(k)) for k in weeks], "window": window, "indicators": out}
+
+
+def _week_label(key: int) -> str:
+    return f"{key // 100}-W{key % 100:02d}"
+
+
+trends = TrendStore(os.getenv("TRENDS_DIR", "trends"), compact_rows=env_int("TRENDS_COMPACT_ROWS", 64))
+
+
+class ReportGenerator:
+    def __init__(self, store: ReportStore):
+        self.store = store
+        self.search_index = SearchIndex(store)
+        # perfil -> respuesta precalculada de /api/latest-report
+        self._latest_payload = {}
+
+    def latest(self, profile: str = DEFAULT_PROFILE):
+        """
+        Devuelve (semana, entrada) del informe más reciente del perfil, o (None, None).
+        """
+        week = self.store.latest_week(profile)
+        if week is None:
+            return None, None
+        return week, self.store.get(week, profile)
+
+    def save(self, week: str, entry: dict, profile: str = DEFAULT_PROFILE):
+        self.store.put(week, entry, profile)
+        try:
+            self.search_index.index_week(week, entry, profile)
+        except Exception:
+            # El informe ya está guardado; el índice se puede rehacer
+            traceback.print_exc()
+        try:
+            if WEEK_RE.match(week):
+                indicators = entry.get("indicators")
+                if indicators is None:
+                    indicators = extract_indicators(entry.get("data") or {})
+                trends.update(profile, week, indicators)
+        except Exception:
+            traceback.print_exc()
+        if week == self.store.latest_week(profile):
+            self._latest_payload[profile] = self._build_payload(week, entry, self.store.generation)
+
+    def latest_payload(self, profile: str = DEFAULT_PROFILE):
+        """
+        Respuesta ya serializada (y comprimida) de /api/latest-report.
+        Se recalcula solo cuando se guarda una semana nueva.
+        """
+        self.store.sync()
+        payload = self._latest_payload.get(profile)
+        if payload is None or payload["generation"] != self.store.generation:
+            week, entry = self.latest(profile)
+            if entry is None:
+                return None
+            payload = self._latest_payload[profile] = self._build_payload(week, entry, self.store.generation)
+        return payload
+
+    @staticmethod
+    def _build_payload(week: str, entry: dict, generation: int) -> dict:
+        body = json.dumps(entry["data"], ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return {
+            "week": week,
+            "generation": generation,
+            "etag": hashlib.sha256(body).hexdigest(),
+            "body": body,
+            "gzip": gzip.compress(body, compresslevel=6),
+        }
+
+    def generate(
+        self, progress=None, source: str = "auto", week: str | None = None, profile: str | None = None, live=None
+    ) -> dict:
+        """
+        progress(stage, **info), si se pasa, recibe el avance (lo usan los jobs).
+        live() dice si alguien sigue el progreso en directo (SSE): solo entonces
+        se pide al modelo la respuesta en streaming.
+        Todo el proceso tiene un presupuesto de GENERATE_DEADLINE segundos.
+
+        source: "network" descarga los feeds, "archive" usa las noticias ya
+        archivadas de la semana y "auto" usa el archivo para semanas pasadas
+        (backfill) o si la semana actual se descargó hace menos de
+        ARCHIVE_FRESH_SECONDS. week (por defecto la actual) permite regenerar
+        semanas anteriores. profile elige el perfil (por defecto, el principal).
+        """
+        if source not in NEWS_SOURCES:
+            raise ValueError(f"source debe ser uno de {', '.join(NEWS_SOURCES)}")
+        report_profile = get_profile(profile)
+        if report_profile is None:
+            raise UnknownProfileError(f"Perfil desconocido: {profile}")
+        week = week or now_week()
+        deadline = Deadline(generate_deadline(), label=f"generate {report_profile.name} {week}")
+        with _active_deadlines_lock:
+            _active_deadlines.add(deadline)
+        run = {"stages": {}, "bytes": {}, "items": {}, "cache": {}}
+        token = _run_stats.set(run)
+        start = time.perf_counter()
+        try:
+            with using_profile(report_profile):
+                return self._generate(week, deadline, progress, source, report_profile.name, live)
+        finally:
+            record_stage("generate_total", time.perf_counter() - start)
+            METRICS.inc("report_generations_total", profile=report_profile.name)
+            _run_stats.reset(token)
+            with _active_deadlines_lock:
+                _active_deadlines.discard(deadline)
+
+    def _collect_items(self, week: str, source: str, deadline: Deadline, progress, profile: str = DEFAULT_PROFILE):
+        """
+        Noticias de la semana, de la red (y se archivan) o del archivo.
+        Devuelve (items, origen).
+        """
+        source = resolve_news_source(week, source, profile)
+        if source == "archive":
+            progress("reading_archive", week=week)
+            items = news_archive.items_for_week(week, limit=max_total_news_items(), profile=profile)
+            if not items:
+                # Un informe "sin noticias" pisaría el de la semana: mejor fallar
+                raise ValueError(f"No hay noticias archivadas para la semana {week}")
+            return items, source
+
+        progress("fetching_news", queries=len(news_queries()) + len(news_feeds()))
+        items = fetch_news_feeds(
+            queries=news_queries(),
+            feeds=news_feeds(),
+            max_items=max_news_items(),
+            lang=news_language(),
+            country=news_country(),
+            max_total=max_total_news_items(),
+            deadline=deadline,
+        )
+        if items:
+            try:
+                progress("news_archived", **news_archive.record(items, week, profile=profile))
+            except Exception:
+                traceback.print_exc()
+        return items, source
+
+    def _generate(
+        self,
+        week: str,
+        deadline: Deadline,
+        progress=None,
+        source: str = "auto",
+        profile: str = DEFAULT_PROFILE,
+        live=None,
+    ) -> dict:
+        # Sin nadie escuchando no merece la pena pedir streaming al modelo; se
+        # decide justo antes de llamarlo (alguien puede haberse conectado ya)
+        stream_progress = model_stream_progress(progress) if progress else None
+
+        def on_delta():
+            return stream_progress if live is not None and live() else None
+
+        progress = progress or (lambda stage, **info: None)
+
+        items, source = self._collect_items(week, source, deadline, progress, profile)
+        record_items("fetched", len(items))
+        progress("news_fetched", items=len(items), source=source)
+
+        compaction = None
+        # Modo incremental: si esta semana ya hay informe, solo mandamos lo nuevo
+        previous = self.store.get(week, profile) if incremental_generation() else None
+        summarized = set((previous or {}).get("summarized_urls") or [])
+        new_items = [it for it in items if it.get("url") not in summarized]
+        # Titulares de todas las noticias vistas esta semana (para la búsqueda)
+        headlines = {h.get("url") or h.get("title"): h for h in _as_list((previous or {}).get("headlines"))}
+        for it in items:
+            headlines.setdefault(
+                it.get("url") or it.get("title"),
+                {"title": it.get("title", ""), "source": it.get("source", ""), "url": it.get("url", "")},
+            )
+
+        if summarized and not new_items:
+            # Nada nuevo desde la última ejecución: ni llamada al modelo ni escritura
+            progress("no_new_items", week=week)
+            return previous["data"]
+        elif not items:
+            METRICS.inc("report_fallback_total", reason="no_news")
+            report_struct = {
+                "title": "Weekly Economic Report",
+                "week": week,
+                "executive_summary": ["No se han podido recuperar noticias (RSS vacío o fallo de red)."],
+                "sections": [{"heading": "Estado del feed", "bullets": ["No hay items disponibles."]}],
+                "sources": [],
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        elif summarized and BREAKERS["openai"].is_open():
+            # OpenAI está fallando: no esperamos, nos quedamos con lo que hay
+            progress("model_circuit_open_keeping_previous")
+            return previous["data"]
+        elif summarized:
+            prompt_items, compaction = compact_news_items(new_items)
+            record_items("prompt", len(prompt_items))
+            progress("compacted", **compaction)
+            progress("calling_model", model=openai_model(), new_items=len(new_items), incremental=True)
+            try:
+                report_struct = update_report_with_openai(
+                    previous["data"], prompt_items, week=week, on_delta=on_delta(), deadline=deadline
+                )
+                summarized.update(compacted_urls(prompt_items))
+            except Exception:
+                # Mejor el informe que ya teníamos que uno de titulares
+                traceback.print_exc()
+                progress("model_failed_keeping_previous")
+                return previous["data"]
+        elif BREAKERS["openai"].is_open():
+            METRICS.inc("report_fallback_total", reason="circuit_open")
+            progress("model_circuit_open_using_fallback")
+            report_struct = build_fallback_report(items, week=week)
+        else:
+            prompt_items, compaction = compact_news_items(items)
+            record_items("prompt", len(prompt_items))
+            progress("compacted", **compaction)
+            mode = report_mode(len(prompt_items))
+            progress("calling_model", model=openai_model(), mode=mode)
+            try:
+                if mode == "map_reduce":
+                    report_struct = build_report_map_reduce(prompt_items, week=week, progress=progress, deadline=deadline)
+                else:
+                    report_struct = build_report_with_openai(prompt_items, week=week, on_delta=on_delta(), deadline=deadline)
+                summarized = compacted_urls(prompt_items)
+                if report_struct.get("from_cache"):
+                    progress("model_cache_hit")
+            except Exception:
+                traceback.print_exc()
+                METRICS.inc("report_fallback_total", reason="model_error")
+                progress("model_failed_using_fallback")
+                report_struct = build_fallback_report(items, week=week)
+
+        with timed("extract_indicators"):
+            indicators = extract_indicators(report_struct, items, previous=(previous or {}).get("indicators"))
+        progress("indicators", **{k: v["value"] for k, v in indicators.items()})
+
+        run = _run_stats.get()
+        with timed("save"):
+            self.save(
+                week,
+                {
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "data": report_struct,
+                    # URLs ya resumidas esta semana (vacío si es un fallback: se reintenta entero)
+                    "summarized_urls": sorted(summarized),
+                    "headlines": list(headlines.values()),
+                    "news_source": source,
+                    "indicators": indicators,
+                    "compaction": compaction,
+                    # Desglose de tiempos/tamaños de esta ejecución (hasta antes de guardar)
+                    "timings": dict(copy.deepcopy(run), deadline=deadline.snapshot()) if run is not None else None,
+                },
+                profile,
+            )
+        progress("saved", week=week, profile=profile)
+        self.prerender(report_struct, week)
+        return report_struct
+
+    def prerender(self, report_struct: dict, week: str):
+        """
+        Deja el PDF listo en cache para que la primera descarga no pague el render.
+        """
+        try:
+            key = report_fingerprint(report_struct)
+            if pdf_cache.get(key) is None:
+                pdf_cache.put(key, render_report_pdf(report_struct, week=week))
+        except Exception:
+            traceback.print_exc()
+
+
+gen = ReportGenerator(
+    ReportStore(
+        os.getenv("REPORTS_DB", "reports.db"),
+        legacy_json=STORAGE_FILE,
+        hot_max=env_int("REPORTS_HOT_MAX", 8),
+    )
+)
+
+
+# ---------------------------
+# Jobs (generación en segundo plano)
+# ---------------------------
+class JobStore:
+    """
+    Estado de los jobs en SQLite (la misma base que los informes), para que
+    todos los workers de gunicorn vean los mismos jobs: /api/jobs/<id> responde
+    en cualquier worker y la deduplicación single-flight vale entre procesos.
+
+    Un job en curso cuyo worker ha muerto (mismo host y PID inexistente) o que
+    lleva más de GENERATE_DEADLINE + 60 s en marcha sin dar señales se da por
+    perdido. Los que siguen en cola solo se pierden si muere su worker.
+    """
+
+    def __init__(self, path: str, keep: int = 100):
+        self.path = path
+        self.keep = max(1, keep)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " id TEXT PRIMARY KEY,"
+                    " key TEXT NOT NULL,"
+                    " status TEXT NOT NULL,"
+                    " owner TEXT NOT NULL,"
+                    " created_at TEXT NOT NULL,"
+                    " finished_at TEXT,"
+                    " updated REAL NOT NULL,"
+                    " events TEXT NOT NULL DEFAULT '[]',"
+                    " result TEXT,"
+                    " error TEXT)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS jobs_active ON jobs (key) WHERE status IN ('queued', 'running')"
+                )
+            self._ready = True
+
+    @staticmethod
+    def _key(key: tuple) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def _stale(self, row: dict) -> bool:
+        # Un job en cola puede esperar lo que haga falta a un hueco del pool: solo
+        # a los que están en marcha se les exige dar señales
+        if row["status"] == "running" and time.time() - row["updated"] > generate_deadline() + 60:
+            return True
+        host, _, pid = row["owner"].rpartition(":")
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            pass
+        return False
+
+    def claim(self, job: "GenerationJob"):
+        """
+        Registra el job si no hay otro en curso con la misma clave. Devuelve la
+        fila del job en curso (y no registra nada) o None si se ha registrado.
+        """
+        self._ensure_ready()
+        key = self._key(job.key)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE key = ? AND status IN ('queued', 'running')", (key,)
+                ).fetchone()
+                if row is not None:
+                    row = self._row(row)
+                    if not self._stale(row):
+                        conn.execute("COMMIT")
+                        return row
+                    self._lose(conn, row["id"])
+                conn.execute(
+                    "INSERT INTO jobs (id, key, status, owner, created_at, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job.id, key, job.status, self.owner, job.created_at, time.time()),
+                )
+                # Olvida los jobs terminados más antiguos
+                conn.execute(
+                    "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN"
+                    " (SELECT id FROM jobs ORDER BY updated DESC LIMIT ?)",
+                    (self.keep,),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def save(self, job: "GenerationJob"):
+        self._ensure_ready()
+        with job._cond:
+            values = (
+                job.status,
+                job.finished_at,
+                time.time(),
+                json.dumps(job.events, ensure_ascii=False, default=str),
+                json.dumps(job.result, ensure_ascii=False, default=str) if job.result is not None else None,
+                json.dumps(job.error, ensure_ascii=False, default=str) if job.error is not None else None,
+                job.id,
+            )
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, updated = ?, events = ?, result = ?, error = ? WHERE id = ?",
+                values,
+            )
+
+    def load(self, job_id: str):
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            row = self._row(row)
+            if row["status"] in ("queued", "running") and self._stale(row):
+                self._lose(conn, job_id)
+                row = self._row(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        return row
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        d = dict(row)
+        d["key"] = tuple(json.loads(d["key"]))
+        d["events"] = json.loads(d["events"] or "[]")
+        d["result"] = json.loads(d["result"]) if d["result"] else None
+        d["error"] = json.loads(d["error"]) if d["error"] else None
+        return d
+
+    @staticmethod
+    def _lose(conn, job_id: str):
+        error = json.dumps({"error": "El worker que ejecutaba el job dejó de responder"}, ensure_ascii=False)
+        conn.execute(
+            "UPDATE jobs SET status = 'error', error = ?, finished_at = ?, updated = ? WHERE id = ?",
+            (error, datetime.now().isoformat(timespec="seconds"), time.time(), job_id),
+        )
+
+
+class GenerationJob:
+    """
+    Una ejecución de ReportGenerator.generate() con su progreso.
+
+    Los jobs de otro worker se representan con refresh: una función que relee
+    su estado de la base de datos (follow() y wait() la llaman periódicamente).
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, key: tuple, refresh=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.finished_at = None
+        self.listeners = 0
+        self._refresh = refresh
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_row(cls, row: dict, refresh=None) -> "GenerationJob":
+        job = cls(row["key"], refresh=refresh)
+        job.id = row["id"]
+        job.created_at = row["created_at"]
+        job.update_from(row)
+        return job
+
+    def update_from(self, row: dict):
+        with self._cond:
+            self.status = row["status"]
+            self.events = row["events"]
+            self.result = row["result"]
+            self.error = row["error"]
+            self.finished_at = row["finished_at"]
+            self._cond.notify_all()
+
+    def refresh(self):
+        if self._refresh is not None and not self.done:
+            self._refresh(self)
+
+    def emit(self, stage: str, **info):
+        with self._cond:
+            self.events.append({"stage": stage, "at": datetime.now().isoformat(timespec="seconds"), **info})
+            self._cond.notify_all()
+
+    def finish(self, status: str, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = datetime.now().isoformat(timespec="seconds")
+            self._cond.notify_all()
+
+    def follow(self, heartbeat: float = 15.0):
+        """
+        Itera los eventos según se producen (los ya emitidos primero) hasta que
+        el job termina. Produce None cada `heartbeat` segundos sin novedades.
+        """
+        i = 0
+        idle_since = time.monotonic()
+        with self._cond:
+            self.listeners += 1
+        try:
+            while True:
+                self.refresh()
+                with self._cond:
+                    if i >= len(self.events) and not self.done:
+                        self._cond.wait(timeout=heartbeat if self._refresh is None else self.POLL_SECONDS)
+                    new = self.events[i:]
+                    i += len(new)
+                    finished = self.done and i >= len(self.events)
+                if new:
+                    idle_since = time.monotonic()
+                elif not finished and time.monotonic() - idle_since >= heartbeat:
+                    idle_since = time.monotonic()
+                    yield None
+                yield from new
+                if finished:
+                    return
+        finally:
+            with self._cond:
+                self.listeners -= 1
+
+    def has_listeners(self) -> bool:
+        return self.listeners > 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error")
+
+    def wait(self, timeout: float | None = None) -> bool:
+        if self._refresh is None:
+            with self._cond:
+                return self._cond.wait_for(lambda: self.done, timeout=timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.refresh()
+            if self.done:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_SECONDS)
+
+    def to_dict(self) -> dict:
+        with self._cond:
+            d = {
+                "job_id": self.id,
+                "status": self.status,
+                "profile": self.key[0],
+                "week": self.key[1],
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "events": list(self.events),
+            }
+        if self.status == "done":
+            d["result"] = self.result
+        if self.status == "error":
+            d["error"] = self.error
+        return d
+
+
+class JobManager:
+    """
+    Cola de generaciones con deduplicación "single-flight": si ya hay un job en
+    curso para el mismo (perfil, semana, consultas, modelo), en este worker o
+    en otro, se devuelve ese en lugar de lanzar otra llamada idéntica a OpenAI.
+    """
+
+    # Como mucho una escritura del progreso por segundo (model_tokens llega cada 0,5 s)
+    SYNC_SECONDS = 1.0
+
+    def __init__(self, store: JobStore, max_workers: int = 1, keep: int = 100):
+        self.store = store
+        self.keep = max(1, keep)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="generate")
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: tuple, fn):
+        """
+        Encola fn(progress, live) y devuelve (job, creado). creado=False si se ha
+        reutilizado un job en curso. live() indica si alguien sigue el job por SSE.
+        """
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                return job, False
+            job = GenerationJob(key)
+            running = self.store.claim(job)
+            if running is not None:
+                return self._remote(running), False
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn)
+        return job, True
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        row = self.store.load(job_id)
+        return self._remote(row) if row is not None else None
+
+    def _remote(self, row: dict) -> GenerationJob:
+        def refresh(job):
+            latest = self.store.load(job.id)
+            if latest is not None:
+                job.update_from(latest)
+
+        return GenerationJob.from_row(row, refresh=refresh)
+
+    def _save(self, job: GenerationJob):
+        try:
+            self.store.save(job)
+        except sqlite3.Error:
+            # El job sigue en este worker; solo se pierde la vista desde los demás
+            traceback.print_exc()
+
+    def _run(self, job: GenerationJob, fn):
+        job.status = "running"
+        job.emit("started")
+        self._save(job)
+        last_sync = time.monotonic()
+
+        def progress(stage: str, **info):
+            nonlocal last_sync
+            job.emit(stage, **info)
+            if time.monotonic() - last_sync >= self.SYNC_SECONDS:
+                last_sync = time.monotonic()
+                self._save(job)
+
+        try:
+            result = fn(progress, job.has_listeners)
+            job.finish("done", result=result)
+        except Exception as e:
+            traceback.print_exc()
+            job.finish(
+                "error",
+                error={
+                    "error": str(e),
+                    "trace": traceback.format_exc().splitlines()[-12:],
+                    "hint": "Mira si OPENAI_API_KEY está puesta y si OPENAI_MODEL existe en tu cuenta.",
+                },
+            )
+        finally:
+            self._save(job)
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+
+    def _prune(self):
+        # Olvida los jobs terminados más antiguos (siguen en la base de datos)
+        finished = [jid for jid, j in self._jobs.items() if j.done]
+        for jid in finished[: max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[jid]
 
-# ---------------------------
-# Persistence + generator
-# ---------------------------
-class ReportGenerator:
-    def __init__(self):
-        self.reports = {}
-        self.load()
 
-    def load(self):
-        try:
-            with open(STORAGE_FILE, "r", encoding="utf-8") as f:
-                self.reports = json.load(f)
-        except Exception:
-            self.reports = {}
+jobs = JobManager(
+    JobStore(os.getenv("REPORTS_DB", "reports.db"), keep=env_int("JOBS_KEEP", 100)),
+    # También es el límite de perfiles que el scheduler genera a la vez
+    max_workers=env_int("GENERATE_WORKERS", min(4, len(load_profiles()))),
+    keep=env_int("JOBS_KEEP", 100),
+)
 
-    def save(self):
-        with open(STORAGE_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.reports, f, ensure_ascii=False, indent=2, default=str)
 
-    def generate(self) -> dict:
-        week = now_week()
+def submit_generation(week: str | None = None, source: str = "auto", profile: str | None = None):
+    week = week or now_week()
+    report_profile = get_profile(profile)
+    if report_profile is None:
+        raise UnknownProfileError(f"Perfil desconocido: {profile}")
+    with using_profile(report_profile):
+        # "auto" se resuelve ya: así comparte job con quien pidió explícitamente lo mismo
+        source = resolve_news_source(week, source, report_profile.name)
+        key = (report_profile.name, week, source, tuple(news_queries()), tuple(news_feeds()), openai_model())
+    return jobs.submit(
+        key,
+        lambda progress, live: gen.generate(
+            progress=progress, source=source, week=week, profile=report_profile.name, live=live
+        ),
+    )
 
-        items = fetch_news_items(
-            query=news_query(),
-            max_items=max_news_items(),
-            lang=news_language(),
-            country=news_country(),
-        )
 
-        if not items:
-            report_struct = {
-                "title": "Weekly Economic Report",
-                "week": week,
-                "executive_summary": ["No se han podido recuperar noticias (RSS vacío o fallo de red)."],
-                "sections": [{"heading": "Estado del feed", "bullets": ["No hay items disponibles."]}],
-                "sources": [],
-                "generated_at": datetime.now().isoformat(timespec="seconds"),
-            }
-        else:
-            try:
-                report_struct = build_report_with_openai(items, week=week)
-            except Exception:
-                report_struct = build_fallback_report(items, week=week)
+def request_profile() -> str:
+    """
+    Perfil pedido con ?profile= (o el de por defecto). UnknownProfileError (404) si no existe.
+    """
+    name = (request.values.get("profile") or "").strip() or None
+    profile = get_profile(name)
+    if profile is None:
+        raise UnknownProfileError(f"Perfil desconocido: {name}")
+    return profile.name
 
-        self.reports[week] = {
-            "timestamp": datetime.now().isoformat(timespec="seconds"),
-            "data": report_struct,
-        }
-        self.save()
-        return report_struct
 
+@app.errorhandler(UnknownProfileError)
+def unknown_profile(e):
+    return jsonify({"error": str(e), "profiles": list(load_profiles())}), 404
 
-gen = ReportGenerator()
+
+def generation_params():
+    """
+    (week, source) de la petición (?week=2025-W07&source=archive). ValueError si no son válidos.
+    """
+    week = (request.values.get("week") or "").strip() or None
+    source = (request.values.get("source") or "auto").strip()
+    if week is not None and not WEEK_RE.match(week):
+        raise ValueError("week debe tener el formato AAAA-Wnn")
+    if source not in NEWS_SOURCES:
+        raise ValueError(f"source debe ser uno de {', '.join(NEWS_SOURCES)}")
+    return week, source
 
 
 # ---------------------------
@@ -317,6 +3666,11 @@ def home():
       padding:10px 12px; border-radius:12px; font-weight:600; cursor:pointer;
     }
     button:hover{ background:rgba(255,255,255,0.10); }
+    select{
+      appearance:none; border:1px solid var(--border); background:rgba(255,255,255,0.06); color:var(--text);
+      padding:10px 12px; border-radius:12px; font-weight:600;
+    }
+    select option{ color:#111; }
     .primary{ background:linear-gradient(135deg, rgba(124,58,237,0.95), rgba(59,130,246,0.85)); border-color:rgba(255,255,255,0.22); }
     .success{ background:rgba(34,197,94,0.16); border-color:rgba(34,197,94,0.35); }
     .kv{ display:grid; grid-template-columns: 140px 1fr; gap:8px 12px; margin-top:10px; font-size:14px; }
@@ -350,6 +3704,7 @@ def home():
         <div class="hd">
           <h2>Último informe</h2>
           <div class="btns">
+            <select id="profile" title="Perfil" hidden></select>
             <button class="primary" id="btnGen">Generar informe (noticias + IA)</button>
             <button id="btnRefresh">Actualizar</button>
             <button class="success" id="btnDownload">Descargar PDF</button>
@@ -380,16 +3735,40 @@ def home():
   const elTs = document.getElementById('ts');
   const dot = document.getElementById('dot');
   const statusText = document.getElementById('statusText');
+  const elProfile = document.getElementById('profile');
 
   function setStatus(ok, msg){
     dot.className = 'dot ' + (ok ? 'ok' : 'bad');
     statusText.textContent = msg;
   }
 
+  // Añade ?profile= con el perfil elegido (si hay varios)
+  function withProfile(url){
+    if(!elProfile.value) return url;
+    return url + (url.includes('?') ? '&' : '?') + 'profile=' + encodeURIComponent(elProfile.value);
+  }
+
+  async function loadProfiles(){
+    try{
+      const r = await fetch('/api/profiles');
+      const j = await r.json();
+      for(const p of j.profiles || []){
+        const opt = document.createElement('option');
+        opt.value = p.name;
+        opt.textContent = p.title || p.name;
+        opt.selected = p.name === j.default;
+        elProfile.appendChild(opt);
+      }
+      elProfile.hidden = (j.profiles || []).length < 2;
+    }catch(e){
+      elProfile.hidden = true;
+    }
+  }
+
   async function loadLatest(){
     try{
       setStatus(true, 'Cargando último informe...');
-      const r = await fetch('/api/latest-report', {cache: 'no-store'});
+      const r = await fetch(withProfile('/api/latest-report'), {cache: 'no-cache'});
       const data = await r.json();
 
       if(data && data.error){
@@ -410,11 +3789,13 @@ def home():
     }
   }
 
+  const sleep = (ms) => new Promise(res => setTimeout(res, ms));
+
   async function generate(){
     try{
       setStatus(true, 'Generando (puede tardar)...');
-      const r = await fetch('/api/generate', {method: 'POST'});
-      const j = await r.json().catch(()=> ({}));
+      const r = await fetch(withProfile('/api/generate'), {method: 'POST'});
+      let j = await r.json().catch(()=> ({}));
 
       // MOSTRAR EL ERROR REAL SI FALLA
       if(!r.ok){
@@ -423,7 +3804,26 @@ def home():
         return;
       }
 
-      elOut.textContent = JSON.stringify(j, null, 2);
+      // El informe se genera en segundo plano: consultamos el job hasta que acabe
+      let misses = 0;
+      while(j.status === 'queued' || j.status === 'running'){
+        const last = (j.events || []).slice(-1)[0];
+        setStatus(true, 'Generando (puede tardar)... ' + (last ? last.stage : j.status));
+        await sleep(1500);
+        const rj = await fetch(j.status_url || ('/api/jobs/' + j.job_id), {cache: 'no-store'});
+        // 404 = el job aún no es visible desde este worker: se reintenta unas cuantas veces
+        if(rj.status === 404 && ++misses <= 5){ continue; }
+        misses = 0;
+        j = Object.assign({status_url: j.status_url}, await rj.json().catch(()=> ({status: 'error'})));
+      }
+
+      if(j.status !== 'done'){
+        elOut.textContent = JSON.stringify(j.error || j, null, 2);
+        setStatus(false, 'Error generando');
+        return;
+      }
+
+      elOut.textContent = JSON.stringify(j.result, null, 2);
       setStatus(true, 'Informe generado ✅');
       await loadLatest();
     }catch(e){
@@ -432,18 +3832,72 @@ def home():
     }
   }
 
+  const STAGE_LABELS = {
+    started: 'Empezando',
+    fetching_news: 'Leyendo RSS',
+    news_fetched: 'RSS leído',
+    compacted: 'Noticias compactadas',
+    calling_model: 'Llamando al modelo',
+    model_tokens: 'Recibiendo respuesta',
+    section_done: 'Sección lista',
+    saved: 'Guardado',
+  };
+
+  // Progreso en directo por Server-Sent Events (si el navegador no lo soporta, polling)
+  function generateStream(){
+    if(!window.EventSource){ return generate(); }
+    setStatus(true, 'Generando...');
+    const log = [];
+    const es = new EventSource(withProfile('/api/generate/stream'));
+
+    es.addEventListener('progress', (msg) => {
+      const ev = JSON.parse(msg.data);
+      const label = STAGE_LABELS[ev.stage] || ev.stage;
+      let detail = '';
+      if(ev.stage === 'news_fetched') detail = ev.items + ' noticias';
+      if(ev.stage === 'compacted') detail = ev.items_out + ' noticias, ' + ev.tokens_saved + ' tokens ahorrados';
+      if(ev.stage === 'model_tokens') detail = ev.chars + ' caracteres';
+      if(ev.stage === 'section_done') detail = ev.heading;
+      setStatus(true, label + (detail ? ' · ' + detail : ''));
+      if(ev.stage !== 'model_tokens'){
+        log.push('[' + ev.at + '] ' + label + (detail ? ': ' + detail : ''));
+        elOut.textContent = log.join(String.fromCharCode(10));
+      }
+    });
+
+    es.addEventListener('result', async (msg) => {
+      es.close();
+      const j = JSON.parse(msg.data);
+      if(j.status !== 'done'){
+        elOut.textContent = JSON.stringify(j.error || j, null, 2);
+        setStatus(false, 'Error generando');
+        return;
+      }
+      elOut.textContent = JSON.stringify(j.result, null, 2);
+      setStatus(true, 'Informe generado ✅');
+      await loadLatest();
+    });
+
+    es.onerror = () => {
+      // Conexión cortada antes del resultado: seguimos por polling
+      es.close();
+      generate();
+    };
+  }
+
   function downloadPdf(){
-    window.location = '/api/download-report';
+    window.location = withProfile('/api/download-report');
   }
 
-  document.getElementById('btnGen').addEventListener('click', generate);
+  document.getElementById('btnGen').addEventListener('click', generateStream);
   document.getElementById('btnRefresh').addEventListener('click', loadLatest);
   document.getElementById('btnDownload').addEventListener('click', downloadPdf);
+  elProfile.addEventListener('change', loadLatest);
 
   document.getElementById('now').textContent =
     new Date().toLocaleString('es-ES', { dateStyle: 'full', timeStyle: 'short' });
 
-  loadLatest();
+  loadProfiles().then(loadLatest);
 </script>
 
 </body>
@@ -453,29 +3907,172 @@ def home():
 
 @app.route("/api/latest-report")
 def latest():
-    if gen.reports:
-        last = max(gen.reports.keys())
-        return jsonify(gen.reports[last]["data"])
-    return jsonify({"error": "No reports"}), 404
+    payload = gen.latest_payload(request_profile())
+    if payload is None:
+        return jsonify({"error": "No reports"}), 404
+
+    # no-cache = el navegador puede guardarlo, pero revalida siempre con el ETag.
+    # Cada codificación es una representación distinta: ETag fuerte propio para cada una
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    gzipped = "gzip" in request.accept_encodings
+    etag = payload["etag"] + "-gzip" if gzipped else payload["etag"]
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304, headers=headers)
+    elif gzipped:
+        resp = Response(payload["gzip"], mimetype="application/json", headers=headers)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(payload["body"], mimetype="application/json", headers=headers)
+    resp.set_etag(etag)
+    return resp
 
 
 @app.route("/api/generate", methods=["POST", "GET"])
 def generate():
+    # Devuelve enseguida el id del job; el progreso se consulta en /api/jobs/<id>
     try:
-        report = gen.generate()
-        return jsonify(report)
-    except Exception as e:
-        # Esto te devuelve el error real a la web
-        return (
-            jsonify(
-                {
-                    "error": str(e),
-                    "trace": traceback.format_exc().splitlines()[-12:],
-                    "hint": "Mira si OPENAI_API_KEY está puesta y si OPENAI_MODEL existe en tu cuenta.",
-                }
-            ),
-            500,
-        )
+        week, source = generation_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job, created = submit_generation(week, source, request_profile())
+    body = job.to_dict()
+    body["deduplicated"] = not created
+    body["status_url"] = f"/api/jobs/{job.id}"
+    return jsonify(body), 202
+
+
+@app.route("/api/archive")
+def archive():
+    # Noticias archivadas de una semana: /api/archive?week=2025-W07[&source=idealista][&profile=madrid]
+    profile = request_profile()
+    week = (request.args.get("week") or now_week()).strip()
+    if not WEEK_RE.match(week):
+        return jsonify({"error": "week debe tener el formato AAAA-Wnn"}), 400
+    items = news_archive.items_for_week(week, source=request.args.get("source") or None, profile=profile)
+    last = news_archive.last_fetch(week, profile)
+    return jsonify(
+        {
+            "profile": profile,
+            "week": week,
+            "items": items,
+            "count": len(items),
+            "last_fetch": datetime.fromtimestamp(last[0]).isoformat(timespec="seconds") if last else None,
+        }
+    )
+
+
+@app.route("/api/search")
+def search():
+    # /api/search?q=euribor+chamberi&page=1&per_page=10[&from=2025-W01&to=2025-W52][&profile=madrid]
+    profile = request_profile()
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "Falta el parámetro q"}), 400
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = min(50, max(1, request.args.get("per_page", 10, type=int)))
+    week_from, week_to = request.args.get("from"), request.args.get("to")
+    for w in (week_from, week_to):
+        if w and not WEEK_RE.match(w):
+            return jsonify({"error": "from/to deben tener el formato AAAA-Wnn"}), 400
+    result = gen.search_index.search(
+        q,
+        page=page,
+        per_page=per_page,
+        week_from=week_from,
+        week_to=week_to,
+        profile=profile,
+    )
+    result["pages"] = -(-result["total"] // per_page)
+    return jsonify(result)
+
+
+@app.route("/api/trends")
+def trends_api():
+    # /api/trends?indicators=euribor,price_m2&from=2024-W01&to=2025-W52&window=4[&profile=madrid]
+    profile = request_profile()
+    names = [n.strip() for n in (request.args.get("indicators") or ",".join(TREND_INDICATORS)).split(",") if n.strip()]
+    unknown = [n for n in names if n not in TREND_INDICATORS]
+    if unknown:
+        return jsonify({"error": f"Indicadores desconocidos: {', '.join(unknown)}", "available": list(TREND_INDICATORS)}), 400
+    week_from, week_to = request.args.get("from"), request.args.get("to")
+    for w in (week_from, week_to):
+        if w and not WEEK_RE.match(w):
+            return jsonify({"error": "from/to deben tener el formato AAAA-Wnn"}), 400
+    window = min(52, max(1, request.args.get("window", 4, type=int)))
+    with timed("trends_query"):
+        result = trend_series(trends.columns(profile, gen.store), names, week_from, week_to, window)
+    return jsonify(dict(result, profile=profile))
+
+
+@app.route("/api/profiles")
+def profiles():
+    out = []
+    for name, profile in load_profiles().items():
+        out.append(dict(profile.to_dict(), latest_week=gen.store.latest_week(name)))
+    return jsonify({"default": default_profile_name(), "profiles": out})
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/health")
+def health():
+    # Estado de los circuit breakers, presupuesto de las generaciones en curso y scheduler
+    return jsonify(dict(upstream_status(), scheduler=scheduler.snapshot()))
+
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def stream_job_events(job: GenerationJob, deduplicated: bool = False) -> Response:
+    """
+    Server-Sent Events con el progreso de un job; el último evento ("result")
+    lleva el informe final o el error.
+    """
+
+    def events():
+        yield _sse("job", {"job_id": job.id, "deduplicated": deduplicated})
+        for ev in job.follow():
+            if ev is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _sse("progress", ev)
+        yield _sse("result", job.to_dict())
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/generate/stream")
+def generate_stream():
+    try:
+        week, source = generation_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job, created = submit_generation(week, source, request_profile())
+    return stream_job_events(job, deduplicated=not created)
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return stream_job_events(job)
 
 
 def _safe_list(items):
@@ -484,16 +4081,25 @@ def _safe_list(items):
     return [x for x in items if isinstance(x, str) and x.strip()]
 
 
-@app.route("/api/download-report")
-def download_report():
-    if not gen.reports:
-        return jsonify({"error": "No reports"}), 404
-
-    last = max(gen.reports.keys())
-    report = gen.reports[last]["data"]
+def render_report_pdf(report: dict, week: str = "") -> bytes:
+    """
+    Construye el PDF (ReportLab) de un informe y devuelve los bytes.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import (
+        ListFlowable,
+        ListItem,
+        Paragraph,
+        SimpleDocTemplate,
+        Spacer,
+        Table,
+        TableStyle,
+    )
 
     title = report.get("title", "Weekly Economic Report")
-    week = report.get("week", last)
+    week = report.get("week", week)
     generated_at = report.get("generated_at", "")
     exec_sum = _safe_list(report.get("executive_summary", []))
     sections = report.get("sections", [])
@@ -580,29 +4186,655 @@ def download_report():
         )
         story.append(table)
 
-    doc.build(story)
-    buffer.seek(0)
+    with timed("pdf_render"):
+        doc.build(story)
+    pdf = buffer.getvalue()
+    record_size("pdf", len(pdf))
+    return pdf
+
+
+@app.route("/api/download-report")
+def download_report():
+    profile = request_profile()
+    last, entry = gen.latest(profile)
+    if not entry:
+        return jsonify({"error": "No reports"}), 404
+
+    report = entry["data"]
+    week = report.get("week", last)
+
+    # El ETag es la huella del contenido: si el navegador ya lo tiene, ni tocamos ReportLab
+    key = report_fingerprint(report)
+    if request.if_none_match.contains(key):
+        resp = Response(status=304)
+        resp.set_etag(key)
+        return resp
 
-    filename = f"weekly_report_{week}.pdf".replace(":", "-")
+    pdf = pdf_cache.get(key)
+    record_cache("pdf", "miss" if pdf is None else "hit")
+    if pdf is None:
+        pdf = render_report_pdf(report, week=last)
+        pdf_cache.put(key, pdf)
+
+    prefix = "weekly_report" if profile == DEFAULT_PROFILE else f"weekly_report_{profile}"
+    filename = f"{prefix}_{week}.pdf".replace(":", "-")
     return send_file(
-        buffer,
+        BytesIO(pdf),
         as_attachment=True,
         download_name=filename,
         mimetype="application/pdf",
+        etag=key,
     )
 
 
-def run_scheduler():
-    schedule.every().day.at("08:00").do(gen.generate)
+# ---------------------------
+# Histórico paginado y exportación
+# ---------------------------
+# Campos de /api/reports y /api/export: los del informe salen de entry["data"],
+# el resto de la entrada guardada.
+REPORT_FIELDS = ("title", "executive_summary", "sections", "sources", "generated_at")
+ENTRY_FIELDS = ("timestamp", "news_source", "indicators", "headlines", "timings")
+DEFAULT_FIELDS = ("week", "timestamp", "title", "executive_summary", "sections", "sources")
+EXPORT_BATCH = env_int("EXPORT_BATCH", 20)
+
+
+def parse_fields(raw: str | None) -> tuple:
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f != "week" and f not in REPORT_FIELDS and f not in ENTRY_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    return fields
+
+
+def project_entry(week: str, entry: dict, fields) -> dict:
+    data = entry.get("data") or {}
+    out = {}
+    for f in fields:
+        if f == "week":
+            out[f] = week
+        elif f in REPORT_FIELDS:
+            out[f] = data.get(f)
+        else:
+            out[f] = entry.get(f)
+    return out
+
+
+def encode_cursor(week: str) -> str:
+    return base64.urlsafe_b64encode(week.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except ValueError:
+        raise ValueError("cursor no válido") from None
+
+
+def history_params() -> dict:
+    """
+    Filtros comunes de /api/reports y /api/export (ValueError si no son válidos).
+    """
+    week_from, week_to = request.args.get("from"), request.args.get("to")
+    for w in (week_from, week_to):
+        if w and not WEEK_RE.match(w):
+            raise ValueError("from/to deben tener el formato AAAA-Wnn")
+    order = (request.args.get("order") or "desc").lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("order debe ser asc o desc")
+    cursor = request.args.get("cursor")
+    return {
+        "fields": parse_fields(request.args.get("fields")),
+        "week_from": week_from,
+        "week_to": week_to,
+        "descending": order == "desc",
+        "after": decode_cursor(cursor) if cursor else None,
+    }
+
+
+def iter_history(profile: str, params: dict, batch: int = EXPORT_BATCH):
+    """
+    Recorre el histórico filtrado de página en página (EXPORT_BATCH semanas
+    cada vez): en memoria nunca hay más de una página.
+    """
+    after = params["after"]
     while True:
-        schedule.run_pending()
-        time.sleep(60)
+        rows = gen.store.page(
+            profile,
+            after=after,
+            limit=batch,
+            descending=params["descending"],
+            week_from=params["week_from"],
+            week_to=params["week_to"],
+        )
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch:
+            return
+        after = rows[-1][0]
+
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def pdf_pool():
+    """
+    Procesos para renderizar PDFs de la exportación (ReportLab es CPU puro y
+    con hilos se serializa en el GIL). Se crea al primer uso; si la plataforma
+    no permite procesos, devuelve None y se renderiza en el propio worker.
+    """
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                import multiprocessing
+
+                try:
+                    # spawn: los hijos no heredan hilos ni conexiones del worker
+                    _pdf_pool = ProcessPoolExecutor(
+                        max_workers=env_int("EXPORT_PDF_WORKERS", min(4, os.cpu_count() or 1)),
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                except (OSError, NotImplementedError):
+                    traceback.print_exc()
+                    _pdf_pool = False
+    return _pdf_pool or None
+
+
+class _ZipStream:
+    """
+    Destino de zipfile que no se puede rebobinar: acumula lo escrito hasta que
+    el generador lo recoge con drain(). Sin tell(), zipfile usa descriptores de
+    datos y no necesita volver atrás.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _render_batch_pdfs(rows: list[tuple]) -> list[bytes]:
+    pdfs = [None] * len(rows)
+    keys = [report_fingerprint(entry.get("data") or {}) for _, entry in rows]
+    missing = []
+    for i, key in enumerate(keys):
+        pdf = pdf_cache.get(key, memory=False)
+        record_cache("pdf", "miss" if pdf is None else "hit")
+        if pdf is None:
+            missing.append(i)
+        else:
+            pdfs[i] = pdf
+    if missing:
+        reports = [rows[i][1].get("data") or {} for i in missing]
+        weeks = [rows[i][0] for i in missing]
+        pool = pdf_pool()
+        with timed("export_pdf_batch"):
+            rendered = pool.map(render_report_pdf, reports, weeks) if pool else map(render_report_pdf, reports, weeks)
+            for i, pdf in zip(missing, rendered):
+                pdfs[i] = pdf
+                # A disco: la próxima exportación y /api/download-report ya no lo renderizan
+                pdf_cache.put(keys[i], pdf, memory=False)
+    return pdfs
+
+
+def export_ndjson(profile: str, params: dict):
+    for rows in iter_history(profile, params):
+        yield "".join(
+            json.dumps(project_entry(week, entry, params["fields"]), ensure_ascii=False, default=str) + "\n"
+            for week, entry in rows
+        )
+
+
+def export_pdf_zip(profile: str, params: dict):
+    out = _ZipStream()
+    prefix = "weekly_report" if profile == DEFAULT_PROFILE else f"weekly_report_{profile}"
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for rows in iter_history(profile, params):
+            # El PDF ya va comprimido: ZIP_STORED evita gastar CPU en recomprimirlo
+            for (week, _), pdf in zip(rows, _render_batch_pdfs(rows)):
+                zf.writestr(f"{prefix}_{week}.pdf".replace(":", "-"), pdf)
+            yield out.drain()
+    yield out.drain()
+
+
+@app.route("/api/reports")
+def reports_history():
+    # /api/reports?limit=20&cursor=...&fields=week,executive_summary[&from=..&to=..&order=asc][&profile=madrid]
+    profile = request_profile()
+    try:
+        params = history_params()
+    except ValueError as e:
+        return jsonify({"error": str(e), "fields": ["week", *REPORT_FIELDS, *ENTRY_FIELDS]}), 400
+    limit = min(100, max(1, request.args.get("limit", 20, type=int)))
+    # Una fila de más para saber si hay página siguiente sin contar
+    rows = gen.store.page(
+        profile,
+        after=params["after"],
+        limit=limit + 1,
+        descending=params["descending"],
+        week_from=params["week_from"],
+        week_to=params["week_to"],
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify(
+        {
+            "profile": profile,
+            "items": [project_entry(week, entry, params["fields"]) for week, entry in rows],
+            "next_cursor": encode_cursor(rows[-1][0]) if more else None,
+        }
+    )
+
+
+@app.route("/api/export")
+def export_reports():
+    # /api/export?format=ndjson|pdf[&fields=..][&from=..&to=..&order=asc][&profile=madrid]
+    profile = request_profile()
+    try:
+        params = history_params()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fmt = (request.args.get("format") or "ndjson").lower()
+    suffix = "" if profile == DEFAULT_PROFILE else f"_{profile}"
+    if fmt == "ndjson":
+        return Response(
+            stream_with_context(export_ndjson(profile, params)),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="reports{suffix}.ndjson"'},
+        )
+    if fmt == "pdf":
+        return Response(
+            stream_with_context(export_pdf_zip(profile, params)),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="reports{suffix}.zip"'},
+        )
+    return jsonify({"error": "format debe ser ndjson o pdf"}), 400
+
+
+# ---------------------------
+# Scheduler (un único líder por máquina)
+# ---------------------------
+_scheduler_lock_fd = None
+
+scheduler_log = stderr_logger("scheduler")
+
+
+def try_become_scheduler_leader() -> bool:
+    """
+    Solo el proceso que consigue el flock de SCHEDULER_LOCK_FILE ejecuta el
+    scheduler. El lock lo libera el sistema si el proceso muere, y otro worker
+    lo recoge en su siguiente intento.
+    """
+    global _scheduler_lock_fd
+    if _scheduler_lock_fd is not None:
+        return True
+    if fcntl is None:
+        # Sin flock (Windows): un solo proceso, siempre líder
+        _scheduler_lock_fd = -1
+        return True
+    fd = os.open(os.getenv("SCHEDULER_LOCK_FILE", "scheduler.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _scheduler_lock_fd = fd
+    return True
+
+
+def schedule_time() -> tuple[int, int]:
+    # Hora diaria del informe (hora del servidor), "HH:MM"
+    raw = os.getenv("SCHEDULE_TIME", "08:00").strip()
+    try:
+        hh, mm = (int(x) for x in raw.split(":"))
+        if 0 <= hh < 24 and 0 <= mm < 60:
+            return hh, mm
+    except ValueError:
+        pass
+    scheduler_log.warning("SCHEDULE_TIME no válida (%r); se usa 08:00", raw)
+    return 8, 0
+
+
+class ScheduledJob:
+    """
+    Tarea diaria: "report:<perfil>" genera el informe; "prefetch:<perfil>"
+    descarga sus feeds unos minutos antes para que a la hora en punto solo
+    quede esperar al modelo.
+
+    catchup: hasta cuántos segundos después de su momento previsto se recupera
+    una ejecución perdida (p. ej. si el proceso estaba caído). Una ejecución a
+    su hora no depende de este valor.
+    """
+
+    def __init__(self, name, kind, profile, hour, minute, offset_minutes, catchup):
+        self.name = name
+        self.kind = kind
+        self.profile = profile
+        self.hour = hour
+        self.minute = minute
+        self.offset = timedelta(minutes=offset_minutes)
+        self.catchup = catchup
+
+    def latest_slot(self, now: datetime) -> datetime:
+        # Última hora programada <= now
+        slot = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0) - self.offset
+        while slot > now:
+            slot -= timedelta(days=1)
+        while slot + timedelta(days=1) <= now:
+            slot += timedelta(days=1)
+        return slot
+
+
+class SchedulerStore:
+    """
+    Última ejecución correcta (y último intento) de cada tarea, en SQLite, para
+    recuperar al arrancar lo que no se hizo mientras el proceso estaba caído.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS scheduler_runs ("
+                    " job TEXT PRIMARY KEY,"
+                    " last_slot TEXT,"
+                    " last_success TEXT,"
+                    " last_attempt TEXT,"
+                    " last_status TEXT,"
+                    " last_error TEXT)"
+                )
+            self._ready = True
+
+    def all(self) -> dict:
+        self._ensure_ready()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT job, last_slot, last_success, last_attempt, last_status, last_error FROM scheduler_runs"
+            ).fetchall()
+        keys = ("last_slot", "last_success", "last_attempt", "last_status", "last_error")
+        return {r[0]: dict(zip(keys, r[1:])) for r in rows}
+
+    def attempt(self, job: str):
+        self._ensure_ready()
+        now = datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO scheduler_runs (job, last_attempt, last_status) VALUES (?, ?, 'running')"
+                " ON CONFLICT(job) DO UPDATE SET last_attempt = excluded.last_attempt, last_status = 'running'",
+                (job, now),
+            )
+
+    def finish(self, job: str, slot: datetime, error: str | None = None):
+        self._ensure_ready()
+        now = datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            if error is None:
+                conn.execute(
+                    "UPDATE scheduler_runs SET last_slot = ?, last_success = ?, last_status = 'ok', last_error = NULL"
+                    " WHERE job = ?",
+                    (slot.isoformat(timespec="seconds"), now, job),
+                )
+            else:
+                conn.execute(
+                    "UPDATE scheduler_runs SET last_status = 'error', last_error = ? WHERE job = ?", (error[:500], job)
+                )
+
+
+def prefetch_profile(name: str) -> dict:
+    """
+    Descarga y archiva las noticias de un perfil (y deja los feeds en cache).
+    """
+    profile = get_profile(name)
+    if profile is None:
+        raise UnknownProfileError(f"Perfil desconocido: {name}")
+    with using_profile(profile):
+        items = fetch_news_feeds(
+            queries=news_queries(),
+            feeds=news_feeds(),
+            max_items=max_news_items(),
+            lang=news_language(),
+            country=news_country(),
+            max_total=max_total_news_items(),
+        )
+    if not items:
+        raise RuntimeError("RSS vacío")
+    return news_archive.record(items, now_week(), profile=name)
+
+
+class Scheduler:
+    """
+    Scheduler persistente: en vez de despertar cada minuto, duerme hasta la
+    próxima tarea pendiente.
+
+    - La última ejecución correcta de cada tarea se guarda en SQLite; al
+      arrancar se recuperan las que se perdieron (si no han pasado más de
+      SCHEDULER_CATCHUP_HOURS).
+    - Cada ejecución se retrasa un jitter aleatorio (0..SCHEDULER_JITTER s) para
+      que varias instancias no vayan a los upstreams en el mismo segundo.
+    - Los feeds se descargan PREFETCH_MINUTES antes; si el prefetch ha ido bien,
+      el informe se genera desde el archivo sin volver a la red.
+    - Un fallo se reintenta cada SCHEDULER_RETRY_MINUTES hasta la siguiente hora.
+    - Los informes de una misma hora se encolan por orden de prioridad de los
+      perfiles (load_profiles()) y se ejecutan hasta GENERATE_WORKERS a la vez.
+    - El retraso se mide desde el momento previsto (hora + jitter): hasta
+      SCHEDULER_GRACE_SECONDS es una ejecución a su hora; más allá, una
+      recuperación.
+    """
+
+    def __init__(self, state: SchedulerStore):
+        self.state = state
+        self.jitter = max(0, env_int("SCHEDULER_JITTER", 120))
+        self.retry = timedelta(minutes=max(1, env_int("SCHEDULER_RETRY_MINUTES", 15)))
+        self.prefetch_minutes = max(0, env_int("PREFETCH_MINUTES", 5))
+        self.catchup = timedelta(hours=max(0, env_int("SCHEDULER_CATCHUP_HOURS", 24)))
+        self.grace = timedelta(seconds=max(1, env_int("SCHEDULER_GRACE_SECONDS", 300)))
+        self._planned = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+    def jobs(self) -> list[ScheduledJob]:
+        hh, mm = schedule_time()
+        out = []
+        for name in load_profiles():
+            if self.prefetch_minutes:
+                # Un prefetch solo sirve antes de su informe
+                minutes = self.prefetch_minutes
+                out.append(ScheduledJob(f"prefetch:{name}", "prefetch", name, hh, mm, minutes, minutes * 60))
+            out.append(ScheduledJob(f"report:{name}", "report", name, hh, mm, 0, self.catchup.total_seconds()))
+        return out
+
+    def _planned_time(self, job: ScheduledJob, slot: datetime) -> datetime:
+        # Jitter fijo por (tipo de tarea, hora) dentro de este proceso: todos los perfiles
+        # vencen a la vez y tick() los lanza en el orden de prioridad de load_profiles()
+        key = (job.kind, slot)
+        if key not in self._planned:
+            self._planned = {k: v for k, v in self._planned.items() if k[1] >= slot - timedelta(days=2)}
+            self._planned[key] = slot + timedelta(seconds=random.uniform(0, self.jitter))
+        return self._planned[key]
+
+    def next_run(self, job: ScheduledJob, state: dict, now: datetime):
+        """
+        (momento, hora programada) de la próxima ejecución de la tarea.
+        """
+        slot = job.latest_slot(now)
+        if state.get("last_slot") and state["last_slot"] >= slot.isoformat(timespec="seconds"):
+            slot += timedelta(days=1)
+            return self._planned_time(job, slot), slot
+        planned = self._planned_time(job, slot)
+        if state.get("last_status") == "error" and state.get("last_attempt"):
+            planned = max(planned, datetime.fromisoformat(state["last_attempt"]) + self.retry)
+        late = now - planned
+        if late > self.grace:
+            # Ya pasó su momento: es una recuperación, que solo se hace dentro de
+            # la ventana y si la tarea ya se había ejecutado alguna vez
+            has_history = bool(state.get("last_slot") or state.get("last_attempt"))
+            if not has_history or late.total_seconds() > job.catchup:
+                slot += timedelta(days=1)
+                return self._planned_time(job, slot), slot
+        return planned, slot
+
+    def tick(self, now: datetime | None = None) -> float:
+        """
+        Lanza lo que toque y devuelve los segundos hasta la siguiente tarea.
+        """
+        now = now or datetime.now()
+        states = self.state.all()
+        wait_until = now + timedelta(hours=1)
+        for job in self.jobs():
+            with self._lock:
+                if job.name in self._running:
+                    continue
+            planned, slot = self.next_run(job, states.get(job.name, {}), now)
+            if planned <= now:
+                self._launch(job, slot, states)
+            else:
+                wait_until = min(wait_until, planned)
+        return max(1.0, (wait_until - now).total_seconds())
+
+    def _launch(self, job: ScheduledJob, slot: datetime, states: dict):
+        with self._lock:
+            self._running.add(job.name)
+        self.state.attempt(job.name)
+        scheduler_log.info("%s (programada %s)", job.name, f"{slot:%Y-%m-%d %H:%M}")
+        if job.kind == "prefetch":
+            self._prefetch_pool.submit(self._run_prefetch, job, slot)
+            return
+        # Si el prefetch de esta misma hora fue bien, el informe no vuelve a la red
+        prefetch = states.get(f"prefetch:{job.profile}", {})
+        prefetch_slot = (slot - timedelta(minutes=self.prefetch_minutes)).isoformat(timespec="seconds")
+        prefetched = bool(prefetch.get("last_slot")) and prefetch["last_slot"] >= prefetch_slot
+        try:
+            gen_job, _ = submit_generation(profile=job.profile, source="archive" if prefetched else "auto")
+        except Exception as e:
+            scheduler_log.exception("%s: no se pudo lanzar", job.name)
+            self._finished(job, slot, str(e))
+            return
+        threading.Thread(target=self._watch, args=(job, slot, gen_job), name=f"watch-{job.name}", daemon=True).start()
+
+    def _run_prefetch(self, job: ScheduledJob, slot: datetime):
+        try:
+            stats = prefetch_profile(job.profile)
+            scheduler_log.info("%s: %s", job.name, stats)
+            self._finished(job, slot, None)
+        except Exception as e:
+            scheduler_log.exception("%s: error", job.name)
+            self._finished(job, slot, str(e))
+
+    def _watch(self, job: ScheduledJob, slot: datetime, gen_job: GenerationJob):
+        gen_job.wait()
+        error = None if gen_job.status == "done" else (gen_job.error or {}).get("error", "error")
+        self._finished(job, slot, error)
+
+    def _finished(self, job: ScheduledJob, slot: datetime, error: str | None):
+        try:
+            self.state.finish(job.name, slot, error)
+        finally:
+            with self._lock:
+                self._running.discard(job.name)
+            self._wake.set()
+
+    def snapshot(self) -> dict:
+        now = datetime.now()
+        states = self.state.all()
+        out = []
+        for job in self.jobs():
+            state = states.get(job.name, {})
+            planned, _ = self.next_run(job, state, now)
+            out.append(
+                dict(state, job=job.name, running=job.name in self._running, next_run=planned.isoformat(timespec="seconds"))
+            )
+        return {"leader": _scheduler_lock_fd is not None, "jobs": out}
+
+    def run(self):
+        while True:
+            if not try_become_scheduler_leader():
+                # Otro proceso es el líder; reintentamos por si muere
+                time.sleep(60)
+                continue
+            try:
+                delay = self.tick()
+            except Exception:
+                scheduler_log.exception("tick")
+                delay = 60.0
+            # Tope de 15 min por si cambia la hora del sistema (DST, NTP)
+            self._wake.wait(timeout=min(delay, 900))
+            self._wake.clear()
+
+
+scheduler = Scheduler(SchedulerStore(os.getenv("SCHEDULER_DB", os.getenv("REPORTS_DB", "reports.db"))))
+
+
+def run_scheduler():
+    scheduler.run()
+
+
+_scheduler_thread = None
+_scheduler_start_lock = threading.Lock()
+
+
+def start_scheduler():
+    """
+    Arranca (una vez por proceso) el hilo del scheduler.
+    """
+    global _scheduler_thread
+    if _scheduler_thread is not None:
+        return
+    with _scheduler_start_lock:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(target=run_scheduler, name="scheduler", daemon=True)
+            _scheduler_thread.start()
+
+
+def scheduler_autostart() -> str:
+    # "import" (por defecto: arranca con el worker) u "off" (tests, benchmarks, procesos auxiliares)
+    mp = sys.modules.get("multiprocessing")
+    if mp is not None and mp.parent_process() is not None:
+        # Hijo de multiprocessing (p. ej. el pool de PDFs de /api/export): importa app.py
+        # para deserializar la tarea, antes de que pueda correr ningún initializer
+        return "off"
+    return os.getenv("SCHEDULER_AUTOSTART", "import").strip().lower()
 
 
-t = threading.Thread(target=run_scheduler, daemon=True)
-t.start()
+# El hilo arranca al cargar el worker, aunque no llegue ninguna petición (el
+# informe de las 08:00 no puede depender del tráfico). Lo que se difiere son
+# los imports pesados.
+if scheduler_autostart() != "off":
+    start_scheduler()
 
 
 if __name__ == "__main__":
+    start_scheduler()
     port = int(os.getenv("PORT", "5000"))
     app.run(host="0.0.0.0", port=port)
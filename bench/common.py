@@ -0,0 +1,176 @@
+"""
+Utilidades compartidas por los benchmarks de bench/: estadísticas, fixtures
+RSS y dobles (stubs) de OpenAI y de la sesión HTTP para trabajar sin red.
+"""
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import types
+from io import BytesIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+# ---------------------------
+# Estadísticas
+# ---------------------------
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "min": round(min(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+        "mean": round(statistics.fmean(values), 3),
+    }
+
+
+def save_results(name: str, result: dict, path: str | None = None) -> str:
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
+
+
+# ---------------------------
+# Fixtures RSS
+# ---------------------------
+def load_fixture(name: str = "google_news_madrid.xml") -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+def scaled_rss(n_items: int, name: str = "google_news_madrid.xml") -> bytes:
+    """
+    Feed con n_items items a partir del fixture grabado: se repiten sus items
+    cambiando enlace y titular para que no sean duplicados exactos.
+    """
+    raw = load_fixture(name).decode("utf-8")
+    items = re.findall(r"<item>.*?</item>", raw, re.DOTALL)
+    head = raw[: raw.index("<item>")]
+    tail = raw[raw.rindex("</item>") + len("</item>") :]
+    out = []
+    for i in range(n_items):
+        it = items[i % len(items)]
+        it = it.replace("?oc=5", f"?oc=5&amp;n={i}", 1)
+        it = it.replace("<title>", f"<title>[{i}] ", 1)
+        out.append(it)
+    return (head + "\n".join(out) + tail).encode("utf-8")
+
+
+# ---------------------------
+# Dobles de OpenAI y HTTP
+# ---------------------------
+CANNED_REPORT = {
+    "title": "Informe semanal del mercado inmobiliario de Madrid",
+    "week": "",
+    "executive_summary": [
+        "El precio de la vivienda usada en Madrid sube un 12,4% interanual.",
+        "El Euríbor cierra septiembre en el 2,17% y abarata las hipotecas variables.",
+        "La oferta disponible cae un 21% y presiona los precios al alza.",
+    ],
+    "sections": [
+        {"heading": "Precios", "bullets": ["Centro supera los 5.200 €/m²; Salamanca roza los 7.900 €/m²."]},
+        {"heading": "Demanda", "bullets": ["7.412 compraventas en agosto (+8%)."]},
+        {"heading": "Oferta/Stock", "bullets": ["Stock en venta −21% en un año."]},
+        {"heading": "Financiación", "bullets": ["Euríbor 2,17%; firma de hipotecas +15%."]},
+        {"heading": "Regulación", "bullets": ["Nuevas zonas tensionadas."]},
+        {"heading": "Riesgos", "bullets": ["Riesgo de sobrecalentamiento, sin burbuja según analistas."]},
+    ],
+    "sources": [{"url": "https://news.google.com/rss/articles/CBMiA0001?oc=5", "note": "idealista"}],
+    "generated_at": "",
+}
+
+
+class StubResponses:
+    def __init__(self, payload: dict, latency: float = 0.0):
+        self.payload = payload
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, stream: bool = False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = json.dumps(self.payload, ensure_ascii=False)
+        if not stream:
+            return types.SimpleNamespace(output_text=text)
+        return iter(
+            [types.SimpleNamespace(type="response.output_text.delta", delta=text[i : i + 16]) for i in range(0, len(text), 16)]
+            + [types.SimpleNamespace(type="response.completed")]
+        )
+
+
+class StubOpenAI:
+    """
+    Sustituto del cliente de OpenAI que devuelve siempre el mismo JSON.
+    """
+
+    def __init__(self, payload: dict | None = None, latency: float = 0.0):
+        self.responses = StubResponses(payload or CANNED_REPORT, latency)
+
+    def with_options(self, **kwargs):
+        return self
+
+
+class _FakeRaw(BytesIO):
+    decode_content = True
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, status_code: int = 200):
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode("utf-8")
+        self.raw = _FakeRaw(body)
+        self.headers = {"ETag": '"fixture"'}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def close(self):
+        self.raw.close()
+
+
+class FakeSession:
+    """
+    Sesión HTTP que sirve siempre el mismo cuerpo RSS (sin red).
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.calls += 1
+        return FakeResponse(self.body)
+
+
+def import_app(workdir: str):
+    """
+    Importa app.py con sus ficheros de datos dentro de workdir.
+    """
+    os.chdir(workdir)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ.setdefault("SCHEDULER_AUTOSTART", "off")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import app
+
+    return app
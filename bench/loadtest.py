@@ -0,0 +1,426 @@
+"""
+Prueba de carga de extremo a extremo: cuántos usuarios del dashboard y
+descargas de PDF aguanta una instancia de gunicorn.
+
+Levanta en local un servidor falso que hace de Google News RSS y de la
+Responses API de OpenAI (con latencia y tasa de fallos configurables), arranca
+la app con gunicorn apuntando a él (NEWS_RSS_BASE_URL, OPENAI_BASE_URL) y la
+somete a tráfico mixto contra /, /api/latest-report, /api/download-report y
+/api/generate. Repite la prueba para cada número de workers e informa por
+endpoint de peticiones/s, latencias p50/p95/p99 y tasa de error.
+
+Los clientes se comportan como el dashboard: reenvían If-None-Match con el
+último ETag recibido, así que los 304 cuentan como respuestas correctas.
+
+Uso:
+    python bench/loadtest.py                               # -w 1,2,4; 16 clientes; 20 s por ronda
+    python bench/loadtest.py --workers 2,4 --concurrency 32 --duration 60
+    python bench/loadtest.py --openai-latency 3 --openai-failure-rate 0.2 --rss-latency 0.5
+    python bench/loadtest.py --mix "/=20,/api/latest-report=60,/api/download-report=15,/api/generate=5"
+
+El generador de carga es Python con hilos: con muchos workers puede ser él el
+cuello de botella (su uso de CPU se muestra al final de cada ronda).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from common import CANNED_REPORT, REPO_ROOT, save_results, scaled_rss, summarize
+
+DEFAULT_MIX = "/=30,/api/latest-report=50,/api/download-report=15,/api/generate=5"
+
+# Respuestas que el cliente da por buenas en cada endpoint
+EXPECTED_STATUS = {
+    "/": {200},
+    "/api/latest-report": {200, 304},
+    "/api/download-report": {200, 304},
+    "/api/generate": {202},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ---------------------------
+# Upstreams falsos (RSS + OpenAI)
+# ---------------------------
+class UpstreamConfig:
+    def __init__(self, rss_items, rss_latency, rss_failure_rate, openai_latency, openai_failure_rate):
+        self.rss_body = scaled_rss(rss_items)
+        self.rss_latency = rss_latency
+        self.rss_failure_rate = rss_failure_rate
+        self.openai_latency = openai_latency
+        self.openai_failure_rate = openai_failure_rate
+        self.counts = {"rss": 0, "rss_failed": 0, "openai": 0, "openai_failed": 0}
+        self.lock = threading.Lock()
+
+    def count(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+
+def _response_object(text: str, model: str) -> dict:
+    # Forma mínima de un objeto "response" de la Responses API
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "id": f"msg_{uuid.uuid4().hex}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {"input_tokens": 1000, "output_tokens": len(text) // 4, "total_tokens": 1000 + len(text) // 4},
+    }
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: UpstreamConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        cfg = self.config
+        if not self.path.startswith("/rss/search"):
+            return self._send(404, b"not found", "text/plain")
+        cfg.count("rss")
+        if cfg.rss_latency:
+            time.sleep(cfg.rss_latency)
+        if random.random() < cfg.rss_failure_rate:
+            cfg.count("rss_failed")
+            return self._send(503, b"unavailable", "text/plain")
+        self._send(200, cfg.rss_body, "application/rss+xml; charset=utf-8")
+
+    def do_POST(self):
+        cfg = self.config
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/responses"):
+            return self._send(404, b'{"error": {"message": "not found"}}', "application/json")
+        cfg.count("openai")
+        if cfg.openai_latency:
+            time.sleep(cfg.openai_latency)
+        if random.random() < cfg.openai_failure_rate:
+            cfg.count("openai_failed")
+            body = json.dumps({"error": {"message": "fake upstream failure", "type": "server_error"}}).encode()
+            return self._send(500, body, "application/json")
+
+        report = dict(CANNED_REPORT, generated_at=time.strftime("%Y-%m-%d %H:%M"))
+        text = json.dumps(report, ensure_ascii=False)
+        response = _response_object(text, payload.get("model", "gpt-4o-mini"))
+        if not payload.get("stream"):
+            return self._send(200, json.dumps(response).encode("utf-8"), "application/json")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        item_id = response["output"][0]["id"]
+        for seq, i in enumerate(range(0, len(text), 64)):
+            event = {
+                "type": "response.output_text.delta",
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": text[i : i + 64],
+                "sequence_number": seq,
+            }
+            self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+        done = {"type": "response.completed", "response": response, "sequence_number": seq + 1}
+        self.wfile.write(f"event: response.completed\ndata: {json.dumps(done)}\n\n".encode("utf-8"))
+        self.close_connection = True
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan conexiones keep-alive al parar gunicorn: no es un error de la prueba
+        pass
+
+
+def start_upstream(config: UpstreamConfig) -> tuple[ThreadingHTTPServer, int]:
+    handler = type("Handler", (UpstreamHandler,), {"config": config})
+    server = QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+# ---------------------------
+# App bajo prueba
+# ---------------------------
+def start_app(workdir: str, workers: int, threads: int, upstream_port: int) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(os.environ)
+    env.update(
+        {
+            "NEWS_RSS_BASE_URL": f"http://127.0.0.1:{upstream_port}/rss/search",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{upstream_port}/v1",
+            "OPENAI_API_KEY": "sk-loadtest",
+            "SCHEDULER_AUTOSTART": "off",
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "-w", str(workers),
+            "--threads", str(threads),
+            "-b", f"127.0.0.1:{port}",
+            "--pythonpath", REPO_ROOT,
+            "--log-level", "warning",
+            "app:app",
+        ],
+        cwd=workdir,
+        env=env,
+        stdout=open(os.path.join(workdir, "gunicorn.log"), "ab"),
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó con código {proc.returncode}; mira {workdir}/gunicorn.log")
+        try:
+            if requests.get(base + "/api/health", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    stop_app(proc)
+    raise RuntimeError("gunicorn no respondió a /api/health en 30 s")
+
+
+def stop_app(proc: subprocess.Popen):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def seed_report(base: str, timeout: float = 120) -> dict:
+    """
+    Genera un informe antes de medir, para que latest-report y el PDF tengan
+    contenido (si el modelo falla se guarda el informe de respaldo).
+    """
+    job = requests.post(base + "/api/generate", timeout=10).json()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        r = requests.get(base + job["status_url"], timeout=10)
+        # Otro worker puede no ver aún el job: un 404 se reintenta
+        state = r.json() if r.status_code != 404 else {}
+        if state.get("status") in ("done", "error"):
+            return state
+        time.sleep(0.25)
+    raise RuntimeError("la generación inicial no terminó a tiempo")
+
+
+# ---------------------------
+# Generador de carga
+# ---------------------------
+def parse_mix(raw: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in raw.split(","):
+        path, _, weight = part.strip().rpartition("=")
+        if path not in EXPECTED_STATUS:
+            raise SystemExit(f"endpoint no soportado en --mix: {path!r}")
+        mix.append((path, float(weight)))
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.statuses: dict[str, dict[str, int]] = {}
+
+    def add(self, path: str, ms: float, status, ok: bool):
+        with self.lock:
+            self.samples.setdefault(path, []).append(ms)
+            if not ok:
+                self.errors[path] = self.errors.get(path, 0) + 1
+            by_status = self.statuses.setdefault(path, {})
+            by_status[str(status)] = by_status.get(str(status), 0) + 1
+
+
+def client_loop(base: str, mix, stop_at: float, measure_from: float, recorder: Recorder, seed: int):
+    rng = random.Random(seed)
+    paths = [p for p, _ in mix]
+    weights = [w for _, w in mix]
+    etags: dict[str, str] = {}
+    session = requests.Session()
+    while True:
+        now = time.monotonic()
+        if now >= stop_at:
+            break
+        path = rng.choices(paths, weights)[0]
+        headers = {"If-None-Match": etags[path]} if path in etags else {}
+        start = time.perf_counter()
+        try:
+            if path == "/api/generate":
+                r = session.post(base + path, timeout=30)
+            else:
+                r = session.get(base + path, headers=headers, timeout=30)
+            r.content
+            status, ok = r.status_code, r.status_code in EXPECTED_STATUS[path]
+            if r.headers.get("ETag"):
+                etags[path] = r.headers["ETag"]
+        except requests.RequestException as e:
+            status, ok = type(e).__name__, False
+        ms = (time.perf_counter() - start) * 1000
+        if now >= measure_from:
+            recorder.add(path, ms, status, ok)
+    session.close()
+
+
+def run_round(base: str, mix, concurrency: int, duration: float, warmup: float) -> dict:
+    recorder = Recorder()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+    cpu0 = resource.getrusage(resource.RUSAGE_SELF)
+    threads = [
+        threading.Thread(target=client_loop, args=(base, mix, stop_at, measure_from, recorder, i), daemon=True)
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cpu1 = resource.getrusage(resource.RUSAGE_SELF)
+    client_cpu = (cpu1.ru_utime - cpu0.ru_utime + cpu1.ru_stime - cpu0.ru_stime) / (duration + warmup)
+
+    endpoints = {}
+    total = errors = 0
+    for path, _ in mix:
+        samples = recorder.samples.get(path, [])
+        n_err = recorder.errors.get(path, 0)
+        total += len(samples)
+        errors += n_err
+        endpoints[path] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / duration, 2),
+            "error_rate": round(n_err / len(samples), 4) if samples else None,
+            "latency_ms": summarize(samples) if samples else None,
+            "statuses": recorder.statuses.get(path, {}),
+        }
+    return {
+        "endpoints": endpoints,
+        "total": {
+            "requests": total,
+            "rps": round(total / duration, 2),
+            "error_rate": round(errors / total, 4) if total else None,
+        },
+        "load_generator_cpu": round(client_cpu, 2),
+    }
+
+
+def print_round(workers: int, result: dict):
+    print(f"\n== gunicorn -w {workers}: {result['total']['rps']} req/s, error {result['total']['error_rate']}"
+          f" (CPU del generador {result['load_generator_cpu']:.2f} núcleos)")
+    print(f"  {'endpoint':<24} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'error':>7}")
+    for path, r in result["endpoints"].items():
+        lat = r["latency_ms"] or {"p50": 0, "p95": 0, "p99": 0}
+        err = f"{r['error_rate'] * 100:.1f}%" if r["error_rate"] is not None else "-"
+        print(f"  {path:<24} {r['rps']:>9.1f} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f} {err:>7}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4", help="valores de gunicorn -w, separados por comas")
+    ap.add_argument("--threads", type=int, default=1, help="gunicorn --threads por worker")
+    ap.add_argument("--concurrency", type=int, default=16, help="clientes simultáneos")
+    ap.add_argument("--duration", type=float, default=20, help="segundos medidos por ronda")
+    ap.add_argument("--warmup", type=float, default=3, help="segundos de calentamiento (no se miden)")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="pesos por endpoint: ruta=peso,...")
+    ap.add_argument("--rss-items", type=int, default=50, help="items del feed falso")
+    ap.add_argument("--rss-latency", type=float, default=0.2, help="segundos por respuesta RSS")
+    ap.add_argument("--rss-failure-rate", type=float, default=0.0)
+    ap.add_argument("--openai-latency", type=float, default=2.0, help="segundos por llamada al modelo")
+    ap.add_argument("--openai-failure-rate", type=float, default=0.0)
+    ap.add_argument("--output", help="ruta del JSON de resultados (por defecto bench/results/)")
+    ap.add_argument("--keep-workdir", action="store_true", help="no borrar el directorio temporal (logs y datos)")
+    args = ap.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    upstream_cfg = UpstreamConfig(
+        args.rss_items, args.rss_latency, args.rss_failure_rate, args.openai_latency, args.openai_failure_rate
+    )
+    upstream, upstream_port = start_upstream(upstream_cfg)
+    print(f"Upstreams falsos en http://127.0.0.1:{upstream_port} (RSS /rss/search, OpenAI /v1/responses)")
+
+    rounds = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+            # Cada ronda empieza con datos y cachés vacíos
+            workdir = tempfile.mkdtemp(prefix=f"wer-load-w{workers}-")
+            proc, base = start_app(workdir, workers, args.threads, upstream_port)
+            try:
+                seeded = seed_report(base)
+                print(f"\n-w {workers}: informe inicial {seeded.get('status')}, midiendo {args.duration:.0f} s"
+                      f" con {args.concurrency} clientes...")
+                result = run_round(base, mix, args.concurrency, args.duration, args.warmup)
+            finally:
+                stop_app(proc)
+                if args.keep_workdir:
+                    print(f"  datos y log en {workdir}")
+                else:
+                    shutil.rmtree(workdir, ignore_errors=True)
+            result.update({"workers": workers, "threads": args.threads, "seed_status": seeded.get("status")})
+            rounds.append(result)
+            print_round(workers, result)
+    finally:
+        upstream.shutdown()
+
+    out = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "keep_workdir")},
+        "upstream_calls": upstream_cfg.counts,
+        "rounds": rounds,
+    }
+    path = save_results("loadtest", out, os.path.abspath(args.output) if args.output else None)
+    print(f"\nLlamadas a upstreams: {upstream_cfg.counts}")
+    print(f"Resultados guardados en {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Micro-benchmarks offline de las etapas del pipeline del informe.
+
+No toca la red: los feeds salen de bench/fixtures (escalados a varios
+tamaños), OpenAI se sustituye por un stub que devuelve un JSON fijo y los
+históricos de informes son sintéticos (10 a 10.000 semanas). Todo se ejecuta
+en un directorio temporal.
+
+Para cada caso se mide latencia (p50/p95/p99), throughput y pico de memoria
+(tracemalloc, en una pasada aparte para no distorsionar los tiempos).
+
+Uso:
+    python bench/pipeline.py                        # todo, guarda bench/results/pipeline-<fecha>.json
+    python bench/pipeline.py --only rss --only store
+    python bench/pipeline.py --quick                # menos iteraciones e históricos hasta 1.000 semanas
+    python bench/pipeline.py --compare bench/results/pipeline-anterior.json
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from common import (
+    CANNED_REPORT,
+    StubOpenAI,
+    FakeSession,
+    import_app,
+    load_fixture,
+    save_results,
+    scaled_rss,
+    summarize,
+)
+
+FEED_SIZES = (10, 100, 1000)
+HISTORY_SIZES = (10, 100, 1000, 10000)
+
+
+def measure(name: str, fn, iterations: int, setup=None, units: int = 1) -> dict:
+    """
+    Ejecuta fn() `iterations` veces (con setup() antes de cada una, fuera del
+    cronómetro) y devuelve latencias en ms, throughput y pico de memoria.
+    """
+    timings = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_s = sum(timings) / 1000
+    result = {
+        "name": name,
+        "iterations": iterations,
+        "latency_ms": summarize(timings),
+        "throughput_per_s": round(iterations * units / total_s, 2) if total_s else None,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+    print(
+        f"{name:<48} p50 {result['latency_ms']['p50']:9.3f} ms  p99 {result['latency_ms']['p99']:9.3f} ms"
+        f"  {result['throughput_per_s'] or 0:>11.1f}/s  pico {result['peak_memory_kb']:>9.1f} KB"
+    )
+    return result
+
+
+def synthetic_week(i: int) -> str:
+    # 10.000 semanas desde 1800: claves con el mismo formato que now_week()
+    return f"{1800 + i // 52}-W{i % 52:02d}"
+
+
+def synthetic_entry(app, week: str, rng: random.Random) -> dict:
+    data = dict(json.loads(json.dumps(CANNED_REPORT)), week=week, generated_at=f"{week} 08:00")
+    data["executive_summary"] = [f"{s} ({rng.randint(0, 999)})" for s in data["executive_summary"]]
+    return {"timestamp": f"{week}T08:00:00", "data": data, "summarized_urls": [f"https://x/{week}/{j}" for j in range(10)]}
+
+
+# ---------------------------
+# Casos
+# ---------------------------
+def bench_clean_text(app, iters: int) -> list[dict]:
+    descs = [
+        "<b>Madrid</b> supera los 5.200 €/m² en el distrito Centro.<br>El alquiler también se encarece.",
+        "El Euríbor a 12 meses   cerró septiembre en el 2,17%,<br />lo que supone un descenso.",
+    ] * 500
+    return [measure("_clean_text (x1000)", lambda: [app._clean_text(d) for d in descs], iters, units=len(descs))]
+
+
+def bench_rss(app, iters: int) -> list[dict]:
+    out = []
+    for n in FEED_SIZES:
+        body = scaled_rss(n)
+        text = body.decode("utf-8")
+        max_items = app.max_news_items()
+        out.append(measure(f"parse_rss_document {n} items -> {max_items}", lambda: app.parse_rss_document(text, max_items), iters))
+        out.append(measure(f"parse_rss_stream   {n} items -> {max_items}", lambda: app.parse_rss_stream(BytesIO(body), max_items), iters))
+        out.append(measure(f"parse_rss_stream   {n} items -> all", lambda: app.parse_rss_stream(BytesIO(body), n), iters))
+    return out
+
+
+def bench_fetch(app, iters: int) -> list[dict]:
+    out = []
+    os.environ["FEED_CACHE_TTL"] = "0"
+    for n in FEED_SIZES:
+        app._http_session = FakeSession(scaled_rss(n))
+
+        def reset():
+            app.feed_cache._mem.clear()
+
+        out.append(
+            measure(
+                f"fetch_news_items (stub HTTP) feed {n}",
+                lambda: app.fetch_news_items(app.news_query(), max_items=app.max_news_items()),
+                iters,
+                setup=reset,
+            )
+        )
+    os.environ["FEED_CACHE_TTL"] = "3600"
+    out.append(measure("fetch_news_items (cache TTL)", lambda: app.fetch_news_items(app.news_query(), max_items=app.max_news_items()), iters))
+    return out
+
+
+def bench_openai(app, iters: int) -> list[dict]:
+    out = []
+    app.client = StubOpenAI()
+    items = app.parse_rss_document(scaled_rss(50).decode("utf-8"), 50)
+    out.append(measure("compact_news_items 50 items", lambda: app.compact_news_items(items), iters))
+
+    def no_cache():
+        app.llm_cache.ttl = 0
+
+    out.append(measure("build_report_with_openai (stub, sin cache)", lambda: app.build_report_with_openai(items[:10], "2026-W41"), iters, setup=no_cache))
+    app.llm_cache.ttl = 3600
+    app.build_report_with_openai(items[:10], "2026-W41")
+    out.append(measure("build_report_with_openai (cache hit)", lambda: app.build_report_with_openai(items[:10], "2026-W41"), iters))
+    return out
+
+
+def bench_store(app, iters: int, sizes) -> list[dict]:
+    out = []
+    rng = random.Random(42)
+    for n in sizes:
+        path = f"history-{n}.db"
+        store = app.ReportStore(path)
+        weeks = [synthetic_week(i) for i in range(n)]
+        entries = [synthetic_entry(app, w, rng) for w in weeks]
+        t0 = time.perf_counter()
+        for w, e in zip(weeks, entries):
+            store.put(w, e)
+        fill_ms = (time.perf_counter() - t0) * 1000
+        print(f"  histórico de {n} semanas creado en {fill_ms:.0f} ms ({fill_ms / n:.3f} ms/semana)")
+
+        extra = iter(range(n, n + iters * 2 + 10))
+
+        def save_one():
+            i = next(extra)
+            app.ReportGenerator(store).save(synthetic_week(i), synthetic_entry(app, synthetic_week(i), rng))
+
+        out.append(measure(f"ReportGenerator.save  history={n}", save_one, iters))
+        out.append(measure(f"latest() en frío     history={n}", lambda: app.ReportGenerator(app.ReportStore(path)).latest(), iters))
+        out.append(
+            measure(f"store.get semana al azar (frío) history={n}", lambda: app.ReportStore(path).get(rng.choice(weeks)), iters)
+        )
+    return out
+
+
+def bench_download(app, iters: int) -> list[dict]:
+    out = []
+    rng = random.Random(7)
+    store = app.ReportStore("download.db")
+    app.gen = app.ReportGenerator(store)
+    week = "2026-W41"
+    app.gen.save(week, synthetic_entry(app, week, rng))
+    client = app.app.test_client()
+
+    def cold():
+        app.pdf_cache._mem.clear()
+        for name in os.listdir(app.pdf_cache.directory) if os.path.isdir(app.pdf_cache.directory) else []:
+            os.remove(os.path.join(app.pdf_cache.directory, name))
+
+    out.append(measure("download_report (render ReportLab)", lambda: client.get("/api/download-report"), iters, setup=cold))
+    out.append(measure("download_report (cache en memoria)", lambda: client.get("/api/download-report"), iters))
+    etag = client.get("/api/download-report").headers["ETag"]
+    out.append(measure("download_report (304 If-None-Match)", lambda: client.get("/api/download-report", headers={"If-None-Match": etag}), iters))
+    out.append(measure("latest-report (payload precalculado)", lambda: client.get("/api/latest-report"), iters))
+    return out
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"\nComparación con {previous_path} (p50):")
+    for r in current["results"]:
+        old = previous.get(r["name"])
+        if not old:
+            continue
+        a, b = old["latency_ms"]["p50"], r["latency_ms"]["p50"]
+        delta = (b - a) / a * 100 if a else 0.0
+        print(f"  {r['name']:<48} {a:9.3f} -> {b:9.3f} ms  ({delta:+.1f}%)")
+
+
+GROUPS = ("clean", "rss", "fetch", "openai", "store", "download")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", action="append", choices=GROUPS, help="ejecuta solo estos grupos (repetible)")
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--quick", action="store_true", help="10 iteraciones e históricos hasta 1.000 semanas")
+    ap.add_argument("--output", help="ruta del JSON de resultados (por defecto bench/results/)")
+    ap.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    args = ap.parse_args(argv)
+
+    iters = 10 if args.quick else args.iterations
+    sizes = tuple(s for s in HISTORY_SIZES if s <= 1000) if args.quick else HISTORY_SIZES
+    groups = args.only or GROUPS
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    with tempfile.TemporaryDirectory(prefix="wer-bench-") as workdir:
+        app = import_app(workdir)
+        load_fixture()  # falla pronto si falta el fixture
+        results = []
+        if "clean" in groups:
+            results += bench_clean_text(app, iters)
+        if "rss" in groups:
+            results += bench_rss(app, iters)
+        if "fetch" in groups:
+            results += bench_fetch(app, iters)
+        if "openai" in groups:
+            results += bench_openai(app, iters)
+        if "store" in groups:
+            results += bench_store(app, iters, sizes)
+        if "download" in groups:
+            results += bench_download(app, iters)
+
+    current = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "iterations": iters,
+        "results": results,
+    }
+    path = save_results("pipeline", current, output)
+    print(f"\nResultados guardados en {path}")
+    if previous:
+        compare(current, previous)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
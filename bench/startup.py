@@ -0,0 +1,129 @@
+"""
+Benchmark de arranque: cuánto tarda un proceso nuevo en importar app.py y en
+responder su primera petición.
+
+Cada muestra es un proceso Python limpio (como un worker de gunicorn recién
+creado), ejecutado en un directorio temporal para no tocar los datos reales.
+
+Uso:
+    python bench/startup.py                      # 10 muestras, tabla por pantalla
+    python bench/startup.py --runs 20 --output startup.json
+    python bench/startup.py --max-import-ms 400  # sale con código 1 si hay regresión
+    python bench/startup.py --importtime          # top de módulos por tiempo de import
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import REPO_ROOT, save_results, summarize
+
+# La línea de resultado lleva este prefijo: app.py (o sus dependencias) puede escribir otras
+RESULT_PREFIX = "BENCH_RESULT "
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+t1 = time.perf_counter()
+resp = app.app.test_client().get("/api/health")
+t2 = time.perf_counter()
+heavy = [m for m in ("openai", "reportlab", "requests") if m in sys.modules]
+print({prefix!r} + json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t2 - t1) * 1000,
+    "status": resp.status_code,
+    "heavy_modules_loaded": heavy,
+}}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env["SCHEDULER_AUTOSTART"] = "off"
+    return env
+
+
+def sample(workdir: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(root=REPO_ROOT, prefix=RESULT_PREFIX)],
+        cwd=workdir,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    line = next(l for l in reversed(out.stdout.splitlines()) if l.startswith(RESULT_PREFIX))
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+def importtime_top(workdir: str, top: int = 15) -> list[dict]:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {REPO_ROOT!r}); import app"],
+        cwd=workdir,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # La sangría del nombre indica anidamiento: nivel 0 = app, nivel 1 = lo que importa app.py
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level > 1:
+            continue
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--output", help="guarda los resultados en JSON")
+    ap.add_argument("--max-import-ms", type=float, help="falla si la mediana de import supera este valor")
+    ap.add_argument("--max-first-request-ms", type=float, help="falla si la mediana de la 1ª petición supera este valor")
+    ap.add_argument("--importtime", action="store_true", help="muestra los módulos que más tardan en importarse")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="wer-startup-") as workdir:
+        samples = [sample(workdir) for _ in range(args.runs)]
+        top = importtime_top(workdir) if args.importtime else None
+
+    result = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_ms": summarize([s["import_ms"] for s in samples]),
+        "first_request_ms": summarize([s["first_request_ms"] for s in samples]),
+        "heavy_modules_loaded": samples[-1]["heavy_modules_loaded"],
+    }
+    if top is not None:
+        result["importtime_top"] = top
+
+    print(f"import app          p50 {result['import_ms']['p50']:8.1f} ms   p95 {result['import_ms']['p95']:8.1f} ms")
+    print(f"primera petición    p50 {result['first_request_ms']['p50']:8.1f} ms   p95 {result['first_request_ms']['p95']:8.1f} ms")
+    print(f"módulos pesados cargados tras la 1ª petición: {', '.join(result['heavy_modules_loaded']) or 'ninguno'}")
+    for row in top or []:
+        print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['module']}")
+
+    if args.output:
+        save_results("startup", result, args.output)
+
+    failed = False
+    if args.max_import_ms is not None and result["import_ms"]["p50"] > args.max_import_ms:
+        print(f"REGRESIÓN: import p50 {result['import_ms']['p50']} ms > {args.max_import_ms} ms")
+        failed = True
+    if args.max_first_request_ms is not None and result["first_request_ms"]["p50"] > args.max_first_request_ms:
+        print(f"REGRESIÓN: primera petición p50 {result['first_request_ms']['p50']} ms > {args.max_first_request_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""
+Los tests importan app.py dentro de un directorio temporal (sus bases de datos
+y caches usan rutas relativas) y sin scheduler.
+"""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["SCHEDULER_AUTOSTART"] = "off"
+os.chdir(tempfile.mkdtemp(prefix="wer-tests-"))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,22 @@
+import app
+
+
+def item(n, title=None):
+    return {
+        "title": title or f"Titular {n} sobre un asunto distinto número {n}",
+        "snippet": f"Detalle {n} " * 20,
+        "source": f"Medio {n}",
+        "url": f"https://medio{n}.example/{n}",
+    }
+
+
+def test_compacted_urls_skip_items_dropped_by_budget():
+    items = [item(n) for n in range(20)]
+    dup = dict(items[0], source="Otro medio", url="https://otro.example/0")
+    compacted, stats = app.compact_news_items(items + [dup], token_budget=60)
+    assert stats["duplicates_collapsed"] == 1
+    assert 0 < stats["items_out"] < len(items)
+
+    urls = app.compacted_urls(compacted)
+    assert urls == {it["url"] for it in compacted} | {dup["url"]}
+    assert items[-1]["url"] not in urls
@@ -0,0 +1,93 @@
+import socket
+from contextlib import closing
+import threading
+
+import app
+
+
+def managers(tmp_path):
+    # Dos JobManager sobre la misma base = dos workers de gunicorn
+    path = str(tmp_path / "reports.db")
+    return app.JobManager(app.JobStore(path)), app.JobManager(app.JobStore(path))
+
+
+def test_job_is_visible_and_deduplicated_across_workers(tmp_path):
+    a, b = managers(tmp_path)
+    release = threading.Event()
+
+    def work(progress, live):
+        progress("fetching_news", queries=1)
+        release.wait(5)
+        return {"title": "ok"}
+
+    key = ("default", "2025-W07", "auto", (), (), "model")
+    job, created = a.submit(key, work)
+    assert created
+
+    other, created = b.submit(key, lambda progress, live: {"title": "duplicado"})
+    assert not created
+    assert other.id == job.id
+
+    seen = b.get(job.id)
+    assert seen is not None and seen.status in ("queued", "running")
+
+    release.set()
+    assert seen.wait(timeout=10)
+    assert seen.status == "done"
+    assert seen.result == {"title": "ok"}
+    assert [e["stage"] for e in seen.events] == ["started", "fetching_news"]
+
+
+def test_job_of_dead_worker_is_not_reused(tmp_path):
+    a, b = managers(tmp_path)
+    key = ("default", "2025-W08", "auto", (), (), "model")
+    ghost = app.GenerationJob(key)
+    ghost.status = "running"
+    b.store.owner = f"{socket.gethostname()}:999999999"
+    assert b.store.claim(ghost) is None
+
+    job, created = a.submit(key, lambda progress, live: {"title": "nuevo"})
+    assert created
+    assert job.wait(timeout=10) and job.status == "done"
+    assert a.get(ghost.id).status == "error"
+
+
+def test_unknown_job(tmp_path):
+    a, _ = managers(tmp_path)
+    assert a.get("no-existe") is None
+
+
+def test_only_running_jobs_expire_by_age(tmp_path, monkeypatch):
+    a, b = managers(tmp_path)
+    monkeypatch.setenv("GENERATE_DEADLINE", "1")
+    queued = app.GenerationJob(("default", "2025-W09", "auto", (), (), "model"))
+    running = app.GenerationJob(("default", "2025-W10", "auto", (), (), "model"))
+    running.status = "running"
+    for job in (queued, running):
+        assert a.store.claim(job) is None
+    # Sin señales desde hace más de GENERATE_DEADLINE + 60 s, con el worker vivo
+    with closing(a.store._connect()) as conn:
+        conn.execute("UPDATE jobs SET updated = updated - 3600")
+
+    assert b.store.load(queued.id)["status"] == "queued"
+    assert b.store.load(running.id)["status"] == "error"
+
+
+def test_auto_source_shares_job_with_resolved_source(tmp_path, monkeypatch):
+    manager, _ = managers(tmp_path)
+    monkeypatch.setattr(app, "jobs", manager)
+    release = threading.Event()
+
+    def generate(**kwargs):
+        release.wait(5)
+        return {"title": kwargs["source"]}
+
+    monkeypatch.setattr(app.gen, "generate", generate)
+    # Semana pasada: "auto" usa el archivo
+    job, created = app.submit_generation(week="2024-W01", source="archive")
+    assert created
+    same, created = app.submit_generation(week="2024-W01", source="auto")
+    assert not created and same.id == job.id
+
+    release.set()
+    assert job.wait(timeout=10) and job.result == {"title": "archive"}
@@ -0,0 +1,29 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    generator = app.ReportGenerator(app.ReportStore(str(tmp_path / "reports.db")))
+    generator.store.put("2025-W07", {"timestamp": "t", "data": {"title": "Informe", "week": "2025-W07"}})
+    monkeypatch.setattr(app, "gen", generator)
+    return app.app.test_client()
+
+
+def test_each_encoding_has_its_own_etag(client):
+    gz = client.get("/api/latest-report", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/api/latest-report", headers={"Accept-Encoding": "identity"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in plain.headers
+    assert gz.headers["ETag"] != plain.headers["ETag"]
+    assert gz.headers["Vary"] == plain.headers["Vary"] == "Accept-Encoding"
+
+
+def test_etag_revalidates_only_its_encoding(client):
+    gz_etag = client.get("/api/latest-report", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    again = client.get("/api/latest-report", headers={"Accept-Encoding": "gzip", "If-None-Match": gz_etag})
+    assert again.status_code == 304
+    other = client.get("/api/latest-report", headers={"Accept-Encoding": "identity", "If-None-Match": gz_etag})
+    assert other.status_code == 200
+    assert other.get_json()["week"] == "2025-W07"
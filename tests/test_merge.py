@@ -0,0 +1,46 @@
+import app
+
+REPORT = {
+    "title": "Informe",
+    "week": "2025-W07",
+    "executive_summary": ["Resumen anterior"],
+    "sections": [
+        {"heading": "Precios", "bullets": ["Sube el m2"]},
+        {"heading": "Demanda", "bullets": ["Más compraventas"]},
+    ],
+    "sources": [{"url": "https://e.com/1", "note": "a"}],
+    "generated_at": "2025-02-17T08:00:00",
+}
+
+
+def test_sections_are_replaced_by_heading_and_new_ones_appended():
+    update = {
+        "sections": [
+            {"heading": " precios ", "bullets": ["El m2 roza los 5.300 €"]},
+            {"heading": "Regulación", "bullets": ["Nueva zona tensionada"]},
+            {"heading": "", "bullets": ["sin encabezado"]},
+        ]
+    }
+    merged = app.merge_report_update(REPORT, update)
+    assert [s["heading"] for s in merged["sections"]] == ["Precios", "Demanda", "Regulación"]
+    assert merged["sections"][0]["bullets"] == ["El m2 roza los 5.300 €"]
+    assert merged["sections"][1]["bullets"] == ["Más compraventas"]
+
+
+def test_empty_update_keeps_previous_content():
+    merged = app.merge_report_update(REPORT, {"executive_summary": [" "], "sections": [{"heading": "Demanda"}]})
+    assert merged["executive_summary"] == ["Resumen anterior"]
+    assert merged["sections"][1]["bullets"] == ["Más compraventas"]
+    assert merged["generated_at"] != REPORT["generated_at"]
+
+
+def test_sources_are_unioned_by_url_and_input_is_not_modified():
+    update = {
+        "executive_summary": ["Resumen nuevo"],
+        "sources": [{"url": "https://e.com/1", "note": "duplicada"}, {"url": "https://e.com/2", "note": "b"}, {"note": "sin url"}],
+    }
+    merged = app.merge_report_update(REPORT, update)
+    assert merged["executive_summary"] == ["Resumen nuevo"]
+    assert merged["sources"] == [{"url": "https://e.com/1", "note": "a"}, {"url": "https://e.com/2", "note": "b"}]
+    assert REPORT["sources"] == [{"url": "https://e.com/1", "note": "a"}]
+    assert REPORT["sections"][0]["bullets"] == ["Sube el m2"]
@@ -0,0 +1,107 @@
+"""
+Bases de datos creadas con el esquema anterior a los perfiles (v0, user_version
+0) que se abren con el código actual.
+"""
+import json
+import sqlite3
+import time
+from contextlib import closing
+
+import app
+
+REPORTS_V0 = (
+    "CREATE TABLE reports (week TEXT PRIMARY KEY, timestamp TEXT NOT NULL, entry TEXT NOT NULL);"
+    "CREATE TABLE search_docs ("
+    " id INTEGER PRIMARY KEY, week TEXT NOT NULL, kind TEXT NOT NULL, heading TEXT NOT NULL,"
+    " text TEXT NOT NULL, url TEXT NOT NULL, length INTEGER NOT NULL);"
+    "CREATE INDEX search_docs_week ON search_docs (week);"
+    "CREATE TABLE search_postings ("
+    " term TEXT NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL,"
+    " PRIMARY KEY (term, doc_id)) WITHOUT ROWID;"
+    "CREATE INDEX search_postings_doc ON search_postings (doc_id);"
+    "CREATE TABLE search_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+)
+
+ARCHIVE_V0 = (
+    "CREATE TABLE news_items ("
+    " id TEXT PRIMARY KEY, url TEXT NOT NULL, canonical_url TEXT NOT NULL, title TEXT NOT NULL,"
+    " source TEXT NOT NULL, published TEXT NOT NULL, snippet TEXT NOT NULL, queries TEXT NOT NULL,"
+    " first_seen REAL NOT NULL, last_seen REAL NOT NULL) WITHOUT ROWID;"
+    "CREATE INDEX news_items_source ON news_items (source, first_seen);"
+    "CREATE TABLE news_item_weeks (week TEXT NOT NULL, item_id TEXT NOT NULL, PRIMARY KEY (week, item_id)) WITHOUT ROWID;"
+    "CREATE TABLE news_fetches (week TEXT PRIMARY KEY, fetched_at REAL NOT NULL, items INTEGER NOT NULL);"
+)
+
+
+def entry(title: str, summary: str) -> dict:
+    return {"timestamp": "2025-02-17T08:00:00", "data": {"title": title, "executive_summary": [summary], "sections": []}}
+
+
+def make_reports_v0(path: str):
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.executescript(REPORTS_V0)
+        for week, e in (("2025-W06", entry("Semana 6", "El Euríbor baja")), ("2025-W07", entry("Semana 7", "Suben los alquileres"))):
+            conn.execute("INSERT INTO reports VALUES (?, ?, ?)", (week, e["timestamp"], json.dumps(e)))
+        # Índice de búsqueda v0 ya construido (sin columna de perfil)
+        terms = app.search_tokens("El Euríbor baja")
+        conn.execute("INSERT INTO search_docs VALUES (1, '2025-W06', 'summary', '', 'El Euríbor baja', '', ?)", (len(terms),))
+        for term in set(terms):
+            conn.execute("INSERT INTO search_postings VALUES (?, 1, ?)", (term, terms.count(term)))
+        conn.execute("INSERT INTO search_meta VALUES ('backfilled', 1), ('docs', 1)")
+
+
+def test_reports_v0_moves_to_default_profile(tmp_path):
+    path = str(tmp_path / "reports.db")
+    make_reports_v0(path)
+
+    store = app.ReportStore(path, legacy_json=None)
+    profile = app.default_profile_name()
+    assert store.weeks(profile) == ["2025-W06", "2025-W07"]
+    assert store.get("2025-W07", profile)["data"]["title"] == "Semana 7"
+    assert store.latest_week(profile) == "2025-W07"
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == app.ReportStore.SCHEMA_VERSION
+
+    # Con la clave (perfil, semana), otro perfil no pisa la misma semana
+    store.put("2025-W07", entry("Otro", "x"), "barcelona")
+    assert store.get("2025-W07", profile)["data"]["title"] == "Semana 7"
+    assert store.weeks("barcelona") == ["2025-W07"]
+
+
+def test_reports_migration_is_idempotent(tmp_path):
+    path = str(tmp_path / "reports.db")
+    make_reports_v0(path)
+    app.ReportStore(path, legacy_json=None).weeks()
+    # Abrir de nuevo (otro worker, reinicio) no vuelve a migrar ni pierde filas
+    assert app.ReportStore(path, legacy_json=None).weeks(app.default_profile_name()) == ["2025-W06", "2025-W07"]
+
+
+def test_search_index_v0_keeps_its_documents(tmp_path):
+    path = str(tmp_path / "reports.db")
+    make_reports_v0(path)
+    index = app.SearchIndex(app.ReportStore(path, legacy_json=None))
+    result = index.search("euribor", profile=app.default_profile_name())
+    assert [r["week"] for r in result["results"]] == ["2025-W06"]
+    assert index.search("euribor", profile="barcelona")["total"] == 0
+
+
+def test_news_archive_v0_moves_to_default_profile(tmp_path):
+    path = str(tmp_path / "news_archive.db")
+    now = time.time()
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.executescript(ARCHIVE_V0)
+        conn.execute(
+            "INSERT INTO news_items VALUES ('n1', 'https://e.com/1', 'https://e.com/1', 'Titular', 'idealista',"
+            " 'Mon, 10 Feb 2025 08:00:00 GMT', 'snippet', '[\"q\"]', ?, ?)",
+            (now, now),
+        )
+        conn.execute("INSERT INTO news_item_weeks VALUES ('2025-W06', 'n1')")
+        conn.execute("INSERT INTO news_fetches VALUES ('2025-W06', ?, 1)", (now,))
+
+    archive = app.NewsArchive(path)
+    profile = app.default_profile_name()
+    assert [it["title"] for it in archive.items_for_week("2025-W06", profile=profile)] == ["Titular"]
+    assert archive.last_fetch("2025-W06", profile)[1] == 1
+    assert archive.items_for_week("2025-W06", profile="barcelona") == []
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == app.NewsArchive.SCHEMA_VERSION
@@ -0,0 +1,22 @@
+import os
+
+import app
+
+
+def test_disk_tier_is_pruned_by_size_keeping_recent(tmp_path):
+    cache = app.PdfCache(str(tmp_path), max_items=1, max_disk_bytes=250)
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, b"x" * 100)
+        os.utime(tmp_path / f"{key}.pdf", (1000 + i, 1000 + i))
+    # Leer "a" lo marca como reciente: el que sobra al meter "c" es "b"
+    cache._mem.clear()
+    assert cache.get("a") == b"x" * 100
+    cache.put("c", b"x" * 100)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.pdf", "c.pdf"]
+
+
+def test_put_leaves_no_temporary_files(tmp_path):
+    cache = app.PdfCache(str(tmp_path))
+    cache.put("k", b"%PDF")
+    cache.put("k", b"%PDF")
+    assert [p.name for p in tmp_path.iterdir()] == ["k.pdf"]
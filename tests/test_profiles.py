@@ -0,0 +1,26 @@
+import app
+
+
+def test_default_profile_follows_the_environment(monkeypatch):
+    monkeypatch.delenv("REPORT_PROFILES", raising=False)
+    monkeypatch.delenv("REPORT_PROFILES_FILE", raising=False)
+    monkeypatch.setenv("NEWS_QUERIES", "euribor|alquiler")
+    assert app.get_profile().queries == ("euribor", "alquiler")
+
+    monkeypatch.setenv("NEWS_QUERIES", "hipotecas")
+    monkeypatch.setenv("NEWS_LANG", "en")
+    profile = app.get_profile()
+    assert profile.queries == ("hipotecas",)
+    assert profile.lang == "en"
+
+
+def test_default_profile_ignores_the_active_profile(monkeypatch):
+    monkeypatch.delenv("REPORT_PROFILES", raising=False)
+    monkeypatch.delenv("REPORT_PROFILES_FILE", raising=False)
+    monkeypatch.setenv("NEWS_QUERIES", "vivienda")
+    monkeypatch.setattr(app, "_profiles_cache", (None, None))
+    other = app.ReportProfile("madrid", ["otra cosa"], lang="fr")
+    with app.using_profile(other):
+        profile = app.get_profile()
+    assert profile.queries == ("vivienda",)
+    assert profile.lang == "es"
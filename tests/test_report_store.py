@@ -0,0 +1,15 @@
+import app
+
+
+def test_writes_of_other_workers_invalidate_the_cache(tmp_path):
+    path = str(tmp_path / "reports.db")
+    a, b = app.ReportStore(path), app.ReportStore(path)
+    a.put("2025-W07", {"timestamp": "1", "data": {"title": "a"}})
+    assert b.get("2025-W07")["data"]["title"] == "a"
+
+    # b escribe y a escribe otra semana justo después: a no debe dar por vista la de b
+    b.put("2025-W07", {"timestamp": "2", "data": {"title": "b"}})
+    a.put("2025-W08", {"timestamp": "3", "data": {"title": "otra"}})
+    assert a.get("2025-W07")["data"]["title"] == "b"
+    assert b.get("2025-W08")["data"]["title"] == "otra"
+    assert open(path + ".version").read().isdigit()
@@ -0,0 +1,64 @@
+import types
+
+import pytest
+
+import app
+
+
+def http_error(status):
+    exc = RuntimeError(f"HTTP {status}")
+    exc.response = types.SimpleNamespace(status_code=status)
+    return exc
+
+
+def half_open_breaker():
+    breaker = app.CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    # Abierto con reset_timeout=0: la próxima llamada pasa como prueba (half_open)
+    breaker.record_failure(RuntimeError("caído"))
+    return breaker
+
+
+def test_client_error_does_not_close_half_open_breaker():
+    breaker = half_open_breaker()
+
+    def fail():
+        raise http_error(404)
+
+    with pytest.raises(RuntimeError):
+        app.call_with_retries(fail, breaker, attempts=3, base_delay=0)
+    assert breaker.state == "half_open"
+    # La llamada de prueba queda libre para la siguiente petición
+    assert breaker.allow()
+
+
+def test_client_error_keeps_failure_count():
+    breaker = app.CircuitBreaker("test", failure_threshold=3)
+    breaker.record_failure(RuntimeError("timeout"))
+
+    def fail():
+        raise http_error(400)
+
+    with pytest.raises(RuntimeError):
+        app.call_with_retries(fail, breaker, base_delay=0)
+    assert breaker.failures == 1
+
+
+def test_success_closes_half_open_breaker():
+    breaker = half_open_breaker()
+    assert app.call_with_retries(lambda: "ok", breaker) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_rss_breakers_are_per_host(monkeypatch):
+    monkeypatch.setenv("RSS_BREAKER_FAILURES", "1")
+    monkeypatch.setattr(app, "BREAKERS", dict(app.BREAKERS))
+    dead = app.rss_breaker("https://caido.example/rss?q=1")
+    dead.record_failure(RuntimeError("timeout"))
+
+    assert dead is app.rss_breaker("https://CAIDO.example/otro")
+    assert dead.is_open()
+    assert not app.rss_breaker("https://news.google.com/rss/search?q=x").is_open()
+    breakers = app.upstream_status()["breakers"]
+    assert breakers["rss:caido.example"]["state"] == "open"
+    assert breakers["rss:news.google.com"]["state"] == "closed"
+    assert "openai" in breakers
@@ -0,0 +1,22 @@
+from io import BytesIO
+
+import pytest
+
+import app
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Feed</title>
+<item><title></title><link>https://example.com/sin-titular</link></item>
+<item><title>Uno</title><link>https://example.com/1</link><pubDate>Mon, 03 Mar 2025 08:00:00 GMT</pubDate></item>
+<item><title>Sin enlace</title><link> </link></item>
+<item><title>Dos</title><link>https://example.com/2</link><description>&lt;b&gt;texto&lt;/b&gt;</description></item>
+<item><title>Tres</title><link>https://example.com/3</link></item>
+</channel></rss>"""
+
+
+@pytest.mark.parametrize("max_items", [0, 1, 2, 10])
+def test_document_and_stream_parsers_agree(max_items):
+    document = app.parse_rss_document(FEED.decode("utf-8"), max_items)
+    stream = app.parse_rss_stream(BytesIO(FEED), max_items)
+    assert document == stream
+    assert [it["title"] for it in stream] == ["Uno", "Dos", "Tres"][:max_items]
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+TODAY = datetime(2025, 3, 12)
+YESTERDAY_SLOT = "2025-03-11T08:00:00"
+
+
+def make_scheduler(tmp_path, monkeypatch, **env):
+    monkeypatch.setenv("SCHEDULE_TIME", "08:00")
+    monkeypatch.setenv("SCHEDULER_JITTER", "120")
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    return app.Scheduler(app.SchedulerStore(str(tmp_path / "scheduler.db")))
+
+
+def job(scheduler, name):
+    return next(j for j in scheduler.jobs() if j.name == name)
+
+
+def test_catchup_zero_still_runs_on_time(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch, SCHEDULER_CATCHUP_HOURS=0)
+    report = job(sched, "report:default")
+    slot = TODAY.replace(hour=8)
+    planned, _ = sched.next_run(report, {"last_slot": YESTERDAY_SLOT}, slot)
+    # El jitter cae dentro de los 120 s y, a su hora, la tarea se lanza
+    assert slot <= planned <= slot + timedelta(seconds=120)
+    assert sched.next_run(report, {"last_slot": YESTERDAY_SLOT}, planned + timedelta(seconds=1)) == (planned, slot)
+
+
+def test_catchup_zero_skips_missed_run(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch, SCHEDULER_CATCHUP_HOURS=0)
+    report = job(sched, "report:default")
+    planned, slot = sched.next_run(report, {"last_slot": YESTERDAY_SLOT}, TODAY.replace(hour=11))
+    assert slot == TODAY.replace(hour=8) + timedelta(days=1)
+    assert planned >= slot
+
+
+def test_missed_run_is_caught_up_within_window(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch, SCHEDULER_CATCHUP_HOURS=24)
+    report = job(sched, "report:default")
+    now = TODAY.replace(hour=11)
+    planned, slot = sched.next_run(report, {"last_slot": YESTERDAY_SLOT}, now)
+    assert slot == TODAY.replace(hour=8)
+    assert planned <= now
+
+
+def test_fresh_state_does_not_catch_up(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch, SCHEDULER_CATCHUP_HOURS=24)
+    report = job(sched, "report:default")
+    _, slot = sched.next_run(report, {}, TODAY.replace(hour=11))
+    assert slot == TODAY.replace(hour=8) + timedelta(days=1)
+
+
+@pytest.mark.parametrize("minutes", [1, 5])
+def test_prefetch_shorter_than_jitter_runs(tmp_path, monkeypatch, minutes):
+    sched = make_scheduler(tmp_path, monkeypatch, PREFETCH_MINUTES=minutes)
+    prefetch = job(sched, "prefetch:default")
+    expected_slot = TODAY.replace(hour=8) - timedelta(minutes=minutes)
+    planned, slot = sched.next_run(prefetch, {}, expected_slot)
+    assert slot == expected_slot
+    assert sched.next_run(prefetch, {}, planned + timedelta(seconds=1)) == (planned, slot)
+
+
+def test_done_slot_moves_to_next_day(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch)
+    report = job(sched, "report:default")
+    state = {"last_slot": "2025-03-12T08:00:00", "last_status": "ok"}
+    planned, slot = sched.next_run(report, state, TODAY.replace(hour=8, minute=30))
+    assert slot == TODAY.replace(hour=8) + timedelta(days=1)
+    assert planned >= slot
+
+
+def test_failed_run_waits_for_retry(tmp_path, monkeypatch):
+    sched = make_scheduler(tmp_path, monkeypatch, SCHEDULER_RETRY_MINUTES=15)
+    report = job(sched, "report:default")
+    state = {"last_slot": YESTERDAY_SLOT, "last_status": "error", "last_attempt": "2025-03-12T08:02:00"}
+    planned, slot = sched.next_run(report, state, TODAY.replace(hour=8, minute=5))
+    assert slot == TODAY.replace(hour=8)
+    assert planned == datetime(2025, 3, 12, 8, 17)
+
+
+class FinishedJob:
+    status = "done"
+    error = None
+
+    def wait(self, timeout=None):
+        return True
+
+
+def test_due_reports_launch_in_priority_order(tmp_path, monkeypatch):
+    monkeypatch.setenv(
+        "REPORT_PROFILES",
+        '[{"name": "zeta", "query": "z", "priority": 0},'
+        ' {"name": "alfa", "query": "a", "priority": 50},'
+        ' {"name": "media", "query": "m", "priority": 10}]',
+    )
+    sched = make_scheduler(tmp_path, monkeypatch, PREFETCH_MINUTES=0)
+    launched = []
+
+    def submit(week=None, source="auto", profile=None):
+        launched.append(profile)
+        return FinishedJob(), True
+
+    monkeypatch.setattr(app, "submit_generation", submit)
+    slot = TODAY.replace(hour=8)
+    state = {"last_slot": YESTERDAY_SLOT}
+    planned = {sched.next_run(j, state, slot)[0] for j in sched.jobs()}
+    # Un único jitter por hora, compartido por todos los perfiles
+    assert len(planned) == 1
+
+    for job in sched.jobs():
+        sched.state.attempt(job.name)
+        sched.state.finish(job.name, datetime.fromisoformat(YESTERDAY_SLOT))
+    sched.tick(planned.pop() + timedelta(seconds=1))
+    assert launched == ["zeta", "media", "alfa"]
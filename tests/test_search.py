@@ -0,0 +1,27 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    generator = app.ReportGenerator(app.ReportStore(str(tmp_path / "reports.db")))
+    generator.store.put(
+        "2025-W07",
+        {"timestamp": "t", "data": {"title": "Informe", "week": "2025-W07", "executive_summary": ["Sube el euríbor"]}},
+    )
+    monkeypatch.setattr(app, "gen", generator)
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("bounds", [{"from": "2025-07"}, {"to": "semana"}, {"from": "2025-W01", "to": "W52"}])
+def test_search_rejects_malformed_weeks(client, bounds):
+    r = client.get("/api/search", query_string=dict(bounds, q="euribor"))
+    assert r.status_code == 400
+    assert r.get_json()["error"] == "from/to deben tener el formato AAAA-Wnn"
+
+
+def test_search_with_week_range(client):
+    r = client.get("/api/search", query_string={"q": "euribor", "from": "2025-W01", "to": "2025-W52"})
+    assert r.status_code == 200
+    assert r.get_json()["total"] == 1
@@ -0,0 +1,54 @@
+import threading
+
+import app
+
+
+def indicators(value):
+    return {"euribor": {"value": value, "mentions": 1, "from": "report"}}
+
+
+def test_concurrent_updates_keep_every_week(tmp_path):
+    # Dos TrendStore sobre el mismo directorio = dos workers
+    stores = [app.TrendStore(str(tmp_path), compact_rows=3) for _ in range(2)]
+    weeks = [f"2025-W{i:02d}" for i in range(1, 21)]
+
+    def save(i, week):
+        stores[i % 2].update("default", week, indicators(float(i)))
+
+    threads = [threading.Thread(target=save, args=(i, w)) for i, w in enumerate(weeks)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for store in (*stores, app.TrendStore(str(tmp_path))):
+        cols = store.columns("default")
+        assert [app._week_label(int(k)) for k in cols["weeks"]] == weeks
+        assert cols["euribor"].tolist() == [float(i) for i in range(20)]
+
+
+def test_update_overwrites_week_and_other_workers_see_it(tmp_path):
+    a, b = app.TrendStore(str(tmp_path)), app.TrendStore(str(tmp_path))
+    a.update("default", "2025-W01", indicators(2.5))
+    assert b.columns("default")["euribor"].tolist() == [2.5]
+    a.update("default", "2025-W01", indicators(2.4))
+    a.update("default", "2025-W02", {})
+    cols = b.columns("default")
+    assert cols["euribor"][0] == 2.4
+    assert len(cols["weeks"]) == 2
+
+
+def test_trend_series_window_is_calendar_weeks(tmp_path):
+    store = app.TrendStore(str(tmp_path))
+    for week, value in (("2025-W01", 1.0), ("2025-W02", 2.0), ("2025-W04", 4.0)):
+        store.update("default", week, indicators(value))
+    series = app.trend_series(store.columns("default"), ["euribor"], window=2)
+    euribor = series["indicators"]["euribor"]
+    assert series["weeks"] == ["2025-W01", "2025-W02", "2025-W04"]
+    assert euribor["moving_average"] == [1.0, 1.5, 4.0]
+    assert euribor["wow_delta"] == [None, 1.0, None]
+
+    # La ventana del primer punto del rango incluye semanas anteriores a from
+    ranged = app.trend_series(store.columns("default"), ["euribor"], week_from="2025-W02", window=2)
+    assert ranged["indicators"]["euribor"]["moving_average"] == [1.5, 4.0]
+    assert ranged["indicators"]["euribor"]["wow_delta"] == [1.0, None]